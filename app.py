@@ -3,19 +3,50 @@
 #----------------------------------------------------------------------------#
 
 import json
+import base64
 import dateutil.parser
 import babel
+import os
 import sys
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import mimetypes
+import functools
+import hashlib
+import click
+import time
+from babel.dates import parse_pattern
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, jsonify, abort, session, make_response, stream_with_context, send_from_directory, g, has_request_context, before_render_template, template_rendered
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy import func, or_, and_, tuple_, event, select, exists, text, inspect, bindparam, union_all, cast
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.orm import deferred, object_session, Session, sessionmaker
+from sqlalchemy.engine import Engine
 from flask_migrate import Migrate
+from cache import create_cache, MemoryCache, FragmentCacheExtension
+from jinja2 import FileSystemBytecodeCache
+from importer import import_rows
+import exporter
+from metrics import Metrics, RequestStats
+from async_db import AsyncDatabase
+from replicas import ReplicaSet
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
+import assets
+from images import ThumbnailCache, HttpFetcher, LocalFetcher, FetchError
+from geocoding import create_geocoder, GeocodeError
+import recommendations
+try:
+  import orjson # optional, faster JSON encoding for the API
+except ImportError:
+  orjson = None
+from datetime import timedelta
+from urllib.parse import urlencode
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -23,10 +54,56 @@ from flask_migrate import Migrate
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+replicas = ReplicaSet(app.config['SQLALCHEMY_REPLICA_URIS'], app.config['REPLICA_HEALTH_INTERVAL'],
+  app.config['REPLICA_CONNECT_TIMEOUT'], **app.config['DB_POOL_OPTIONS']) if app.config['SQLALCHEMY_REPLICA_URIS'] else None
+
+# Views that only read. Their queries go to a read replica unless this user
+# committed something in the last REPLICA_STICKY_SECONDS (read-your-writes);
+# every other view, and anything outside a request, uses the primary.
+READ_ONLY_ENDPOINTS = {
+  'index', 'venues', 'search_venues', 'show_venue', 'artists', 'search_artists',
+  'show_artist', 'shows', 'shows_feed', 'export', 'thumbnail', 'api.api_list', 'api.api_detail',
+  'api.api_available_venues', 'api.api_show_calendar', 'api.api_venues_near'
+}
+
+class RoutingSession(SignallingSession):
+  def get_bind(self, mapper=None, clause=None):
+    if not self._flushing and has_request_context() and g.get('replica') is not None:
+      return g.replica
+    return SignallingSession.get_bind(self, mapper, clause)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+  def create_session(self, options):
+    return sessionmaker(class_=RoutingSession, db=self, **options)
+
+db = RoutingSQLAlchemy(app)
+
+@app.before_request
+def route_reads():
+  # one replica for the whole request: its page version and its body must
+  # come from the same snapshot, and choose() is not free
+  g.use_replica = replicas is not None and request.endpoint in READ_ONLY_ENDPOINTS and \
+    session.get('primary_until', 0) < time.time()
+  g.replica = replicas.choose() if g.use_replica else None
+
+@event.listens_for(Session, 'after_commit')
+def stick_to_primary(sess):
+  if replicas is not None and has_request_context():
+    session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
 
 
 migrate = Migrate(app, db) 
+response_cache = create_cache(app.config)
+
+# compiled templates are shared by all workers through the bytecode cache;
+# rendered fragments ({% cache %}) are kept per worker
+os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+app.jinja_env.add_extension(FragmentCacheExtension)
+if app.config['FRAGMENT_CACHE_MAX_ENTRIES']:
+  app.jinja_env.fragment_cache = MemoryCache(app.config['FRAGMENT_CACHE_TTL'], app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+async_db = AsyncDatabase(app.config['ASYNC_DATABASE_URL'], **app.config['DB_POOL_OPTIONS']) \
+  if app.config.get('ASYNC_DATABASE_URL') else None
 
 # DONE : connect to a local postgresql database
 
@@ -49,6 +126,24 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
     shows = db.relationship('Show', backref='venue', cascade="all,delete", lazy=True) #cascade delete so when you delete a venue it deletes all shows for that venue
+    search_vector = deferred(db.Column(TSVECTOR)) # maintained by a database trigger, see migrations
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0) # kept up to date with Show, see "Show counters"
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    # filled in by `flask geocode-venues`; geocoded_at is cleared whenever the
+    # address changes so the venue is geocoded again
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geocoded_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+      db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_Venue_search_vector', 'search_vector', postgresql_using='gin'),
+      db.Index('ix_Venue_state_city', 'state', 'city'),
+      db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+      # cube/earthdistance; answers earth_box(...) @> ll_to_earth(latitude, longitude)
+      db.Index('ix_Venue_location', func.ll_to_earth(latitude, longitude), postgresql_using='gist'),
+    )
     
     def __repr__(self):
       return f"VENue('{self.id}', '{self.name}', '{self.genres}', '{self.city}', '{self.state}', '{self.address}', '{self.phone}', '{self.image_link}', '{self.facebook_link}')"
@@ -69,6 +164,16 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
     shows = db.relationship('Show', backref='artist', lazy=True)
+    search_vector = deferred(db.Column(TSVECTOR)) # maintained by a database trigger, see migrations
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0) # kept up to date with Show, see "Show counters"
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+      db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_Artist_search_vector', 'search_vector', postgresql_using='gin'),
+      db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     def __repr__(self):
       return f"ARtist('{self.name}')"
@@ -79,26 +184,872 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # the table is partitioned by month of start_time in PostgreSQL, where the
+    # primary key is (id, start_time); see migrations
+    # [start_time, end_time) may not overlap another show at the same venue or
+    # by the same artist: enforced by the Show_*_no_overlap exclusion
+    # constraints (PostgreSQL, see migrations) within each month's partition,
+    # and across months only by the locked check on create (lock_bookings)
+    end_time = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+      db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+      db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+      db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+      db.CheckConstraint('end_time > start_time', name='Show_ends_after_start'),
+    )
 
     def __repr__(self):
         return f"<Show('{self.id}', '{self.venue_id}'>"
 
+class Recommendation(db.Model):
+    # precomputed by `flask recommend` (see recommendations.py); the detail
+    # pages only read them. No foreign keys: the table is rebuilt as a whole
+    # and suggestions of since deleted rows drop out of the joins that read it.
+    __tablename__ = 'Recommendation'
+    kind = db.Column(db.String(32), primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    candidate_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<Recommendation('{self.kind}', '{self.subject_id}', '{self.candidate_id}')>"
+
 # DONE Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+def count_show(connection, show, step):
+  # move the venue's and artist's counter by step in the same transaction
+  # that inserts the show
+  start_time = show.start_time
+  if isinstance(start_time, str):
+    start_time = dateutil.parser.parse(start_time)
+  counter = 'upcoming_shows_count' if start_time > datetime.now() else 'past_shows_count'
+  for model, entity_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+    table = model.__table__
+    connection.execute(table.update()
+      .where(table.c.id == entity_id)
+      .values({counter: table.c[counter] + step}))
+
+@event.listens_for(Show, 'after_insert')
+def count_new_show(mapper, connection, target):
+  count_show(connection, target, 1)
+
+@event.listens_for(Show, 'after_delete')
+def uncount_deleted_show(mapper, connection, target):
+  # a show that started since the last refresh-show-counts is still counted
+  # as upcoming, so recount both counters rather than guess which one to
+  # decrement
+  now = datetime.now()
+  for model, column, entity_id in ((Venue, Show.venue_id, target.venue_id), (Artist, Show.artist_id, target.artist_id)):
+    connection.execute(model.__table__.update()
+      .where(model.id == entity_id)
+      .values(show_count_values(model, column, now)))
+
+def show_count_values(model, column, now):
+  # both counters of model as correlated subqueries over Show
+  upcoming = select([func.count(Show.id)]).where(column == model.id).where(Show.start_time > now).as_scalar()
+  past = select([func.count(Show.id)]).where(column == model.id).where(Show.start_time <= now).as_scalar()
+  return {'upcoming_shows_count': upcoming, 'past_shows_count': past}
+
+def refresh_show_counts(now, since=None):
+  # recompute the counters from Show. With `since`, only venues and artists
+  # that have a show which started between since and now (moved from
+  # upcoming to past) are touched; without it, every row is.
+  for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    update = model.__table__.update().values(show_count_values(model, column, now))
+    if since is not None:
+      update = update.where(model.id.in_(
+        select([column]).where(Show.start_time > since).where(Show.start_time <= now)))
+    db.session.execute(update)
+  db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+geocoder = create_geocoder(app.config)
+
+@event.listens_for(Venue, 'before_update')
+def forget_venue_location(mapper, connection, target):
+  # a venue that moved is geocoded again by the next `flask geocode-venues`
+  state = inspect(target)
+  if any(state.attrs[name].history.has_changes() for name in ('address', 'city', 'state')):
+    target.latitude = target.longitude = target.geocoded_at = None
+
+def geocode_venues(batch_size=100, everything=False):
+  # geocode the venues that have not been yet (or all of them), batch_size
+  # per transaction in id order, so an interrupted run loses one batch at
+  # most. Places the geocoder does not know are marked as done without
+  # coordinates; venues whose lookup failed are retried by the next run.
+  table = Venue.__table__
+  update = table.update().where(table.c.id == bindparam('venue_id')).values(
+    latitude=bindparam('lat'), longitude=bindparam('lon'), geocoded_at=bindparam('at'))
+  last_id, located, unknown, failed = 0, 0, 0, 0
+  while True:
+    query = db.session.query(Venue.id, Venue.address, Venue.city, Venue.state).filter(Venue.id > last_id)
+    if not everything:
+      query = query.filter(Venue.geocoded_at.is_(None))
+    rows = query.order_by(Venue.id).limit(batch_size).all()
+    if not rows:
+      break
+    last_id = rows[-1].id
+    records = []
+    for row in rows:
+      try:
+        location = geocoder.geocode(row.address, row.city, row.state)
+      except GeocodeError as e:
+        app.logger.warning('Geocoding venue %s failed: %s', row.id, e)
+        failed += 1
+        continue
+      if location is None:
+        unknown += 1
+      else:
+        located += 1
+      latitude, longitude = location or (None, None)
+      records.append({'venue_id': row.id, 'lat': latitude, 'lon': longitude, 'at': datetime.utcnow()})
+    # core update: no updated_at bump, the pages do not show coordinates
+    if records:
+      db.session.execute(update, records)
+    db.session.commit()
+  return located, unknown, failed
+
+#----------------------------------------------------------------------------#
+# Recommendations.
+#----------------------------------------------------------------------------#
+
+def refresh_recommendations(k, genre_weight, chunk_size, batch_size=10000):
+  # recompute every suggestion from Show and the genres and swap them in with
+  # one transaction: pages keep reading the previous set until the commit
+  artists = db.session.query(Artist.id, Artist.genres).order_by(Artist.id).all()
+  venues = db.session.query(Venue.id, Venue.genres).order_by(Venue.id).all()
+  shows = db.session.execute(select([Show.artist_id, Show.venue_id]))
+  table = Recommendation.__table__
+  computed_at = datetime.utcnow()
+  stored = 0
+  try:
+    db.session.execute(table.delete())
+    batch = []
+    for kind, subject_id, position, candidate_id, score in recommendations.recommend(
+        artists, venues, shows, k, genre_weight, chunk_size):
+      batch.append({"kind": kind, "subject_id": subject_id, "position": position,
+        "candidate_id": candidate_id, "score": score, "computed_at": computed_at})
+      if len(batch) >= batch_size:
+        db.session.execute(table.insert(), batch)
+        stored += len(batch)
+        batch = []
+    if batch:
+      db.session.execute(table.insert(), batch)
+      stored += len(batch)
+    db.session.commit()
+  except:
+    db.session.rollback()
+    raise
+  return stored
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+def query_key(*names):
+  # cache key made of the query parameters the view reads, in a fixed order;
+  # anything else in the query string does not create another entry
+  def key(**kwargs):
+    return urlencode([(name, value) for name in names for value in request.args.getlist(name)])
+  return key
+
+def cached_page(namespace, key=lambda **kwargs: ''):
+  # serve a rendered page from response_cache; entries are dropped by the
+  # model events below whenever a commit touches the data behind them.
+  # Inside conditional_page every entry is stored with the page version it
+  # was rendered for and only served for that version, so a change that
+  # purges nothing (a show starting, a refreshed counter, an old page put
+  # back by a reader on a lagging replica) can never be served under a newer
+  # ETag.
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+      # pages carrying flashed messages are specific to one user
+      if response_cache is None or '_flashes' in session:
+        return view(**kwargs)
+      cache_key = key(**kwargs)
+      version = g.get('page_version')
+      entry = response_cache.get(namespace, cache_key)
+      if entry is not None and entry[0] == version:
+        return entry[1]
+      body = view(**kwargs)
+      if isinstance(body, str):
+        response_cache.set(namespace, cache_key, (version, body))
+      return body
+    return wrapper
+  return decorator
+
+def stale_pages(target, connection):
+  # (namespace, key) pairs whose rendered page shows data from target; a key
+  # of None drops the whole namespace
+  if isinstance(target, Show):
+    return {('venues', None), ('shows', None),
+            ('venue', str(target.venue_id)), ('artist', str(target.artist_id))}
+  if isinstance(target, Venue):
+    # artist pages list the venues they played at
+    artist_ids = connection.execute(
+      select([Show.artist_id]).where(Show.venue_id == target.id).distinct())
+    return {('venues', None), ('shows', None), ('venue', str(target.id))} | \
+           {('artist', str(row[0])) for row in artist_ids}
+  if isinstance(target, Artist):
+    venue_ids = connection.execute(
+      select([Show.venue_id]).where(Show.artist_id == target.id).distinct())
+    return {('artists', None), ('shows', None), ('artist', str(target.id))} | \
+           {('venue', str(row[0])) for row in venue_ids}
+  return set()
+
+def record_stale_pages(mapper, connection, target):
+  sess = object_session(target)
+  if sess is not None and response_cache is not None:
+    sess.info.setdefault('stale_pages', set()).update(stale_pages(target, connection))
+
+for model in (Venue, Artist, Show):
+  for model_event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(model, model_event, record_stale_pages)
+
+@event.listens_for(Session, 'after_commit')
+def purge_stale_pages(sess):
+  for namespace, key in sess.info.pop('stale_pages', ()):
+    response_cache.delete(namespace, key)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_pages(sess):
+  sess.info.pop('stale_pages', None)
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def conditional_page(version):
+  # answer with 304 Not Modified when the client's ETag still matches.
+  # version(now, **view_args) runs a cheap query returning a tuple that
+  # changes whenever the rendered page would; the view itself only runs when
+  # it did. No Last-Modified: the tuple also holds counts and row sets that
+  # change without any timestamp in it moving, so only the ETag is exact.
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+      if '_flashes' in session:
+        return view(**kwargs)
+      state = version(datetime.now(), **kwargs)
+      g.page_version = hashlib.sha1(repr(state).encode()).hexdigest()
+      etag = hashlib.sha1((request.full_path + g.page_version).encode()).hexdigest()
+
+      not_modified = request.if_none_match.contains(etag)
+      response = make_response('', 304) if not_modified else make_response(view(**kwargs))
+      response.set_etag(etag)
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Instrumentation.
+#----------------------------------------------------------------------------#
+
+metrics = Metrics()
+
+@app.before_request
+def start_request_stats():
+  g.request_stats = RequestStats()
+  g.request_start = time.perf_counter()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+  duration = time.perf_counter() - conn.info['query_start'].pop()
+  if has_request_context() and 'request_stats' in g:
+    g.request_stats.record_query(statement, duration)
+
+@event.listens_for(Engine, 'handle_error')
+def drop_query_timer(context):
+  # a failed statement never reaches after_cursor_execute; drop its start
+  # time so the next statement on this connection is not timed against it
+  if context.connection is not None and context.execution_context is not None and context.connection.info.get('query_start'):
+    context.connection.info['query_start'].pop()
+
+def start_render_timer(sender, template, context, **extra):
+  if 'request_stats' in g:
+    g.render_start = time.perf_counter()
+
+def record_render(sender, template, context, **extra):
+  if 'render_start' in g:
+    g.request_stats.render_time += time.perf_counter() - g.pop('render_start')
+
+before_render_template.connect(start_render_timer, app)
+template_rendered.connect(record_render, app)
+
+def observe_request(endpoint, stats, start):
+  duration = time.perf_counter() - start
+  repeated = stats.repeated_statements(app.config['N_PLUS_ONE_THRESHOLD'])
+  for statement, count in repeated:
+    app.logger.warning('Possible N+1 in %s: statement ran %d times: %s',
+      endpoint, count, ' '.join(statement.split())[:200])
+  metrics.observe(endpoint, duration, stats, bool(repeated))
+  return duration
+
+@app.after_request
+def record_request_stats(response):
+  if 'request_stats' not in g:
+    return response
+  stats = g.request_stats
+  if response.is_streamed:
+    # a streamed body (e.g. /export) runs its queries after this hook, while
+    # stream_with_context keeps recording them into stats; observe the
+    # request once the body has been sent
+    response.call_on_close(functools.partial(observe_request, request.endpoint, stats, g.request_start))
+    return response
+  duration = observe_request(request.endpoint, stats, g.request_start)
+
+  if app.debug:
+    response.headers['X-Query-Count'] = str(stats.queries)
+    response.headers['Server-Timing'] = 'db;dur={:.1f}, render;dur={:.1f}, total;dur={:.1f}'.format(
+      stats.db_time * 1000, stats.render_time * 1000, duration * 1000)
+  return response
+
+#----------------------------------------------------------------------------#
+# Templates.
+#----------------------------------------------------------------------------#
+
+def precompile_templates():
+  # compile every page once, filling the shared bytecode cache and this
+  # process's template cache; run before forking workers
+  names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+  for name in names:
+    app.jinja_env.get_template(name)
+  return names
+
+#----------------------------------------------------------------------------#
+# Assets.
+#----------------------------------------------------------------------------#
+
+# built bundles (flask build-assets); in debug the source files are served
+# individually so edits show up without a rebuild
+asset_manifest = {} if app.debug else assets.load_manifest(app.static_folder)
+
+def asset_urls(bundle):
+  if bundle in asset_manifest:
+    return [url_for('asset_file', filename=asset_manifest[bundle])]
+  return [url_for('static', filename=source) for source in assets.BUNDLES[bundle]]
+
+app.jinja_env.globals['asset_urls'] = asset_urls
+
+@app.route('/assets/<path:filename>')
+def asset_file(filename):
+  # bundle names change with their content, so they can be cached forever;
+  # precompressed variants are sent when the client accepts them
+  directory = os.path.join(app.static_folder, assets.DIST)
+  response = None
+  for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+    path = safe_join(directory, filename + suffix)
+    if request.accept_encodings[encoding] and path and os.path.isfile(path):
+      response = send_from_directory(directory, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+      response.headers['Content-Encoding'] = encoding
+      break
+  if response is None:
+    response = send_from_directory(directory, filename)
+  response.headers['Vary'] = 'Accept-Encoding'
+  response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+  return response
+
+#----------------------------------------------------------------------------#
+# Images.
+#----------------------------------------------------------------------------#
+
+thumbnails = ThumbnailCache(
+  app.config['IMAGE_CACHE_DIR'],
+  LocalFetcher(app.config['IMAGE_FETCH_DIR']) if app.config['IMAGE_FETCH_DIR'] else HttpFetcher(),
+  app.config['IMAGE_CACHE_MAX_BYTES'])
+
+def thumbnail_url(kind, entity_id, image_link, width=300):
+  # local, resized copy of a venue's or artist's image_link. The v parameter
+  # changes with the link, which lets the image be cached forever.
+  if not image_link or not thumbnails.available:
+    return image_link
+  width = min(app.config['THUMBNAIL_WIDTHS'], key=lambda w: abs(w - width))
+  return url_for('thumbnail', kind=kind, entity_id=entity_id, width=width,
+    v=hashlib.sha1(image_link.encode()).hexdigest()[:10])
+
+app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+
+@app.route('/images/<any(venue, artist):kind>/<int:entity_id>/<int:width>')
+def thumbnail(kind, entity_id, width):
+  if width not in app.config['THUMBNAIL_WIDTHS'] or not thumbnails.available:
+    abort(404)
+  model = Venue if kind == 'venue' else Artist
+  image_link = db.session.query(model.image_link).filter(model.id == entity_id).scalar() or abort(404)
+  # only an explicit image/webp counts: accept_mimetypes['image/webp'] also
+  # matches image/* and */*, which browsers without WebP send too
+  webp = any(mimetype == 'image/webp' and quality > 0 for mimetype, quality in request.accept_mimetypes)
+  format = 'webp' if webp else 'jpeg'
+  try:
+    path, mimetype = thumbnails.thumbnail(image_link, width, format)
+  except FetchError as e:
+    app.logger.warning('Thumbnail failed: %s', e)
+    return redirect(image_link)
+  response = send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype=mimetype)
+  response.headers['Vary'] = 'Accept'
+  response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+  return response
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+DEFAULT_LOCALE = babel.default_locale('LC_TIME') or 'en_US_POSIX'
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+  # compiling a Babel pattern and parsing a locale are the expensive parts of
+  # formatting, and there are only a handful of (format, locale) pairs
+  return parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+@functools.lru_cache(maxsize=4096)
+def cached_format_datetime(value, format, locale):
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium', locale=DEFAULT_LOCALE):
+  # accepts datetime objects directly; strings are still parsed for callers
+  # that only have the text form
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  return cached_format_datetime(value, format, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def catalog_filter_args():
+  # ?genre= (repeatable) with ?match=all|any, ?city= and ?state= narrowing
+  # the venue and artist listings and searches
+  match = request.values.get('match', 'all')
+  if match not in ('all', 'any'):
+    abort(400, 'match must be all or any')
+  return {
+    'genres': [genre for genre in request.values.getlist('genre') if genre],
+    'match': match,
+    'city': request.values.get('city') or None,
+    'state': request.values.get('state') or None
+  }
+
+def filter_catalog(model, query, genres=None, match='all', city=None, state=None):
+  # genres are matched with @> (has all of them) or && (has any of them),
+  # both served by the GIN index on the genres array. The parameter is cast
+  # to the column's varchar[]: there is no varchar[] @> text[] operator.
+  if genres:
+    genres = cast(genres, ARRAY(db.String))
+    query = query.filter(model.genres.contains(genres) if match == 'all' else model.genres.overlap(genres))
+  if city:
+    query = query.filter(model.city == city)
+  if state:
+    query = query.filter(model.state == state)
+  return query
+
+def genre_facets(model, query):
+  # (genre, count) over the rows query matches, in one aggregate over
+  # unnest(genres); most common genres first
+  genres = query.with_entities(func.unnest(model.genres).label('genre')).order_by(None).subquery()
+  count = func.count().label('count')
+  return db.session.query(genres.c.genre, count) \
+    .group_by(genres.c.genre).order_by(count.desc(), genres.c.genre).all()
+
+def genre_facet_links(endpoint, facets, filters):
+  # each facet with the url that adds its genre to (or removes it from) the
+  # current filters
+  links = []
+  for genre, count in facets:
+    selected = genre in filters['genres']
+    genres = [g for g in filters['genres'] if g != genre] if selected else filters['genres'] + [genre]
+    params = dict(genre=genres, match=filters['match'] if filters['match'] != 'all' else None,
+      city=filters['city'], state=filters['state'])
+    links.append({
+      "genre" : genre,
+      "count" : count,
+      "selected" : selected,
+      "url" : url_for(endpoint, **{name: value for name, value in params.items() if value})
+    })
+  return links
+
+def venue_directory(**filters):
+  # one statement for the whole /venues page, reading the maintained upcoming
+  # show counters, ordered so rows for the same city/state are adjacent
+  rows = db.session.query(
+      Venue.id, Venue.name, Venue.city, Venue.state, Venue.updated_at,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')
+    )
+  rows = filter_catalog(Venue, rows, **filters).order_by(Venue.state, Venue.city, Venue.id)
+
+  areas = []
+  for row in rows:
+    if not areas or areas[-1]['city'] != row.city or areas[-1]['state'] != row.state:
+      areas.append({
+        "city" : row.city,
+        "state" : row.state,
+        "venues" : []
+      })
+    areas[-1]['venues'].append({
+      "id" : row.id,
+      "name" : row.name,
+      "updated_at" : row.updated_at,
+      "num_upcoming_shows" : row.num_upcoming_shows
+    })
+  return areas
+
+def search_catalog(model, search_term, page=1, per_page=None, **filters):
+  # ranked, paged name search. The substring match is served by the pg_trgm
+  # index on name and the full-text match by the search_vector index (name,
+  # city, state and genres). filters are those of filter_catalog, and the
+  # result carries the genre facet counts.
+  per_page = per_page or app.config['SEARCH_PAGE_SIZE']
+  page = max(page, 1)
+  term = search_term.strip()
+  pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+  query = model.query
+  if term:
+    ts_query = func.plainto_tsquery('simple', term)
+    query = query.filter(or_(
+      model.name.ilike(pattern, escape='\\'),
+      model.search_vector.op('@@')(ts_query)
+    ))
+    rank = func.ts_rank(model.search_vector, ts_query) + func.similarity(model.name, term)
+    query = query.order_by(rank.desc(), model.name)
+  else:
+    query = query.order_by(model.name)
+  query = filter_catalog(model, query, **filters)
+
+  return {
+    "count" : query.order_by(None).count(),
+    "facets" : genre_facets(model, query),
+    "data" : query.limit(per_page).offset((page - 1) * per_page).all(),
+    "page" : page,
+    "per_page" : per_page
+  }
+
+# kinds of Recommendation shown on a venue's or artist's page, with the
+# model the suggested ids belong to
+SUGGESTIONS = {
+  Venue : (('similar_venues', Venue), ('artists_for_venue', Artist)),
+  Artist : (('similar_artists', Artist), ('venues_for_artist', Venue))
+}
+
+def suggestions_statement(model, entity_id):
+  # the stored suggestions for one venue or artist with the suggested rows'
+  # names, every kind in one statement reading the Recommendation primary key
+  return union_all(*[
+    select([
+        Recommendation.kind, Recommendation.position, Recommendation.candidate_id,
+        candidate.name, candidate.image_link, candidate.updated_at
+      ]).select_from(Recommendation.__table__.join(candidate.__table__, candidate.id == Recommendation.candidate_id))
+      .where(Recommendation.kind == kind).where(Recommendation.subject_id == entity_id)
+    for kind, candidate in SUGGESTIONS[model]
+  ])
+
+def suggestions_version(model, entity_id):
+  # changes when `flask recommend` reruns or a suggested row is edited
+  return [
+    select([func.max(func.greatest(Recommendation.computed_at, candidate.updated_at))])
+      .select_from(Recommendation.__table__.join(candidate.__table__, candidate.id == Recommendation.candidate_id))
+      .where(Recommendation.kind == kind).where(Recommendation.subject_id == entity_id)
+      .correlate(None).as_scalar()
+    for kind, candidate in SUGGESTIONS[model]
+  ]
+
+def load_details(model, entity_id, counterpart, now):
+  # the venue (or artist) row, all of its shows joined to the other side's
+  # name and image, and its precomputed suggestions: three independent
+  # queries, run concurrently on the async engine when ASYNC_DATABASE_URL is
+  # set. The past/upcoming flag is computed by the database against the same
+  # `now` for every row.
+  columns = [column for column in model.__table__.columns if column.name != 'search_vector']
+  entity = db.session.query(*columns).filter(model.id == entity_id).statement
+  prefix = counterpart.__tablename__.lower()
+  shows = db.session.query(
+      Show.venue_id, Show.artist_id, Show.start_time,
+      counterpart.name, counterpart.image_link, counterpart.updated_at,
+      (Show.start_time > now).label('upcoming')
+    ).join(counterpart, counterpart.id == getattr(Show, prefix + '_id')) \
+    .filter(getattr(Show, model.__tablename__.lower() + '_id') == entity_id) \
+    .order_by(Show.start_time).statement
+
+  suggestions = suggestions_statement(model, entity_id)
+
+  # the async engine always reads ASYNC_DATABASE_URL (the primary); requests
+  # routed to a replica stay on the session so replica reads keep working
+  if async_db is not None and g.get('replica') is None:
+    entity_rows, show_rows, suggestion_rows = async_db.gather(entity, shows, suggestions,
+      on_query=g.request_stats.record_query if 'request_stats' in g else None)
+  else:
+    entity_rows = db.session.execute(entity).fetchall()
+    show_rows = db.session.execute(shows).fetchall()
+    suggestion_rows = db.session.execute(suggestions).fetchall()
+  if not entity_rows:
+    abort(404)
+
+  past_shows = []
+  upcoming_shows = []
+  for row in show_rows:
+    show = {
+      "venue_id" : row.venue_id,
+      "artist_id" : row.artist_id,
+      prefix + "_name" : row.name,
+      prefix + "_image_link" : row.image_link,
+      prefix + "_updated_at" : row.updated_at,
+      "start_time" : row.start_time
+    }
+    (upcoming_shows if row.upcoming else past_shows).append(show)
+
+  suggested = {kind: [] for kind, candidate in SUGGESTIONS[model]}
+  for row in sorted(suggestion_rows, key=lambda row: (row.kind, row.position)):
+    suggested[row.kind].append({
+      "id" : row.candidate_id,
+      "name" : row.name,
+      "image_link" : row.image_link,
+      "updated_at" : row.updated_at
+    })
+  return entity_rows[0], past_shows, upcoming_shows, suggested
+
+def encode_cursor(start_time, show_id):
+  raw = '{}|{}'.format(start_time.isoformat(), show_id)
+  return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+  try:
+    start_time, show_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(start_time), int(show_id)
+  except (ValueError, UnicodeError):
+    abort(400)
+
+def show_range_args():
+  # ?start=&end= (ISO 8601), ?venue_id=, ?city= and ?state= narrowing a
+  # show listing or calendar
+  filters = {}
+  try:
+    for name in ('start', 'end'):
+      if request.args.get(name):
+        filters[name] = datetime.fromisoformat(request.args[name])
+  except ValueError:
+    abort(400, 'start and end must be ISO 8601 datetimes')
+  filters['venue_id'] = request.args.get('venue_id', type=int)
+  filters['city'] = request.args.get('city')
+  filters['state'] = request.args.get('state')
+  return filters
+
+def filter_shows(query, start=None, end=None, venue_id=None, city=None, state=None):
+  # query must already join Venue when filtering on city or state
+  if start is not None:
+    query = query.filter(Show.start_time >= start)
+  if end is not None:
+    query = query.filter(Show.start_time < end)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if city:
+    query = query.filter(Venue.city == city)
+  if state:
+    query = query.filter(Venue.state == state)
+  return query
+
+def show_feed(now, cursor=None, limit=None, upcoming_only=True, **filters):
+  # one page of shows in (start_time, id) order, joined to venue and artist
+  # names. Paging is keyset based: the cursor is the last row of the previous
+  # page, so every page costs the same no matter how deep it is.
+  # between 1 and SHOWS_MAX_PAGE_SIZE whatever ?limit= says
+  limit = max(1, min(limit or app.config['SHOWS_PAGE_SIZE'], app.config['SHOWS_MAX_PAGE_SIZE']))
+  query = db.session.query(
+      Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.updated_at,
+      Venue.name.label('venue_name'),
+      Venue.updated_at.label('venue_updated_at'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+      Artist.updated_at.label('artist_updated_at')
+    ).join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
+  if upcoming_only:
+    query = query.filter(Show.start_time > now)
+  query = filter_shows(query, **filters)
+  if cursor:
+    query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(*decode_cursor(cursor)))
+  rows = query.order_by(Show.start_time, Show.id).limit(limit + 1).all()
+
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+  return rows, next_cursor
+
+CALENDAR_BUCKETS = ('day', 'week', 'month')
+
+def show_calendar(bucket, by=None, **filters):
+  # number of shows per day, week or month (optionally also per venue or per
+  # city/state) in one GROUP BY over date_trunc(start_time); with a start/end
+  # range only the matching Show partitions are scanned
+  period = func.date_trunc(bucket, Show.start_time).label('period')
+  columns = [period]
+  if by == 'venue':
+    columns.append(Show.venue_id)
+  elif by == 'city':
+    columns += [Venue.city, Venue.state]
+  query = db.session.query(*(columns + [func.count(Show.id).label('shows')]))
+  if by == 'city' or filters.get('city') or filters.get('state'):
+    query = query.join(Venue, Venue.id == Show.venue_id)
+  query = filter_shows(query, **filters)
+  return query.group_by(*columns).order_by(*columns).all()
+
+def show_version_columns(now):
+  # changes when a show is added, edited or removed, or moves from upcoming
+  # to past
+  return [
+    func.max(Show.updated_at),
+    func.count(Show.id),
+    func.count(Show.id).filter(Show.start_time > now)
+  ]
+
+def venues_version(now):
+  # counter updates bump Venue.updated_at, so this never needs to touch Show
+  return tuple(db.session.query(func.max(Venue.updated_at), func.count(Venue.id)).one())
+
+def artists_version(now):
+  return tuple(db.session.query(func.max(Artist.updated_at), func.count(Artist.id)).one())
+
+def shows_page(now):
+  # the /shows page (rows, next cursor), queried once per request: the ETag
+  # is derived from it and the view renders it
+  if 'shows_page' not in g:
+    g.shows_page = show_feed(now, request.args.get('cursor'), request.args.get('limit', type=int),
+      request.args.get('past') is None, **show_range_args())
+  return g.shows_page
+
+def shows_version(now):
+  # built from the page's own rows, so checking it costs the same keyset read
+  # as the page rather than aggregates over every show, venue and artist
+  rows, next_cursor = shows_page(now)
+  return tuple(value for row in rows
+    for value in (row.id, row.updated_at, row.venue_updated_at, row.artist_updated_at)) + (next_cursor,)
+
+def venue_version(now, venue_id):
+  state = db.session.query(Venue.updated_at, func.max(Artist.updated_at), *show_version_columns(now),
+      *suggestions_version(Venue, venue_id)) \
+    .select_from(Venue) \
+    .outerjoin(Show, Show.venue_id == Venue.id) \
+    .outerjoin(Artist, Artist.id == Show.artist_id) \
+    .filter(Venue.id == venue_id) \
+    .group_by(Venue.id).first()
+  if state is None:
+    abort(404)
+  return tuple(state)
+
+def artist_version(now, artist_id):
+  state = db.session.query(Artist.updated_at, func.max(Venue.updated_at), *show_version_columns(now),
+      *suggestions_version(Artist, artist_id)) \
+    .select_from(Artist) \
+    .outerjoin(Show, Show.artist_id == Artist.id) \
+    .outerjoin(Venue, Venue.id == Show.venue_id) \
+    .filter(Artist.id == artist_id) \
+    .group_by(Artist.id).first()
+  if state is None:
+    abort(404)
+  return tuple(state)
+
+CATALOG_MODELS = {
+  'venues' : Venue,
+  'artists' : Artist,
+  'shows' : Show
+}
+
+def export_rows(kind):
+  # every row of one table, read through a server-side cursor in blocks of
+  # EXPORT_BATCH_SIZE so memory stays flat however large the table is
+  model = CATALOG_MODELS[kind]
+  columns = [column for column in model.__table__.columns if column.name != 'search_vector']
+  rows = db.session.query(*columns) \
+    .order_by(model.id) \
+    .execution_options(stream_results=True) \
+    .yield_per(app.config['EXPORT_BATCH_SIZE'])
+  return [column.name for column in columns], rows
+
+def overlapping(start, end):
+  # shows whose [start_time, end_time) overlaps [start, end); on PostgreSQL
+  # as a range overlap, which the GiST exclusion constraint indexes serve
+  if db.engine.dialect.name == 'postgresql':
+    return func.tsrange(Show.start_time, Show.end_time).op('&&')(func.tsrange(start, end))
+  return and_(Show.start_time < end, Show.end_time > start)
+
+def lock_bookings(venue_id, artist_id):
+  # serialize bookings of the same venue or artist until the transaction
+  # ends, so the conflict check and the insert can't interleave with another
+  # booking. The exclusion constraints can't stand in for this: they only
+  # compare shows within one monthly partition, and a show crossing midnight
+  # at the end of a month is not compared with the next month's.
+  if db.engine.dialect.name == 'postgresql':
+    db.session.execute(text('SELECT pg_advisory_xact_lock(1, :venue_id), pg_advisory_xact_lock(2, :artist_id)'),
+      {'venue_id': int(venue_id), 'artist_id': int(artist_id)})
+
+def booking_conflicts(venue_id, artist_id, start, end):
+  return db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time) \
+    .filter(or_(Show.venue_id == venue_id, Show.artist_id == artist_id)) \
+    .filter(overlapping(start, end)) \
+    .order_by(Show.start_time).all()
+
+def available_venues(start, end, city=None, state=None, cursor=None, limit=None):
+  # venues with no show overlapping [start, end): one anti-join, answered
+  # from the venue exclusion constraint's index
+  query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state) \
+    .filter(~exists().where(and_(Show.venue_id == Venue.id, overlapping(start, end))))
+  if city:
+    query = query.filter(Venue.city == city)
+  if state:
+    query = query.filter(Venue.state == state)
+  if cursor is not None:
+    query = query.filter(Venue.id > cursor)
+  return query.order_by(Venue.id).limit(limit).all()
+
+def venues_near(latitude, longitude, km, upcoming_only=True, limit=None):
+  # venues within km of the point, nearest first. earth_box() @> ll_to_earth()
+  # is answered by the GiST index ix_Venue_location; the box is a little
+  # larger than the circle, so earth_distance() trims its corners.
+  origin = func.ll_to_earth(latitude, longitude)
+  location = func.ll_to_earth(Venue.latitude, Venue.longitude)
+  distance = func.earth_distance(origin, location)
+  query = db.session.query(
+      Venue.id, Venue.name, Venue.address, Venue.city, Venue.state,
+      Venue.latitude, Venue.longitude, Venue.upcoming_shows_count,
+      distance.label('distance')
+    ).filter(func.earth_box(origin, km * 1000).op('@>')(location)) \
+    .filter(distance <= km * 1000)
+  if upcoming_only:
+    query = query.filter(Venue.upcoming_shows_count > 0)
+  return query.order_by(distance, Venue.id).limit(limit).all()
+
+def next_shows(venue_ids, now):
+  # the first upcoming show of each venue, one DISTINCT ON query walking
+  # ix_Show_venue_id_start_time
+  rows = db.session.query(Show.venue_id, Show.start_time, Show.artist_id, Artist.name.label('artist_name')) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(Show.venue_id.in_(venue_ids), Show.start_time > now) \
+    .distinct(Show.venue_id).order_by(Show.venue_id, Show.start_time).all()
+  return {row.venue_id: row for row in rows}
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -111,74 +1062,31 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional_page(venues_version)
+@cached_page('venues', query_key('genre', 'match', 'city', 'state'))
 def venues():
   #DONE: replace with real venues data.
   #      num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  city_state = Venue.query.with_entities(Venue.city, Venue.state).group_by(Venue.city, Venue.state).all()
-
-  #build out the venues list, grouped by city/state
-  for loc in city_state:
-    cityvenue = Venue.query.filter_by(state=loc.state).filter_by(city=loc.city).all()
-    venue_names = []
-    for v in cityvenue:
-      upcoming_shows = Show.query.filter_by(venue_id=v.id).filter(Show.start_time > datetime.now()).all()
-      venue_names.append({
-        "id" : v.id,
-        "name" : v.name,
-        "num_upcoming_shows" : len(upcoming_shows)
-      })
-    data.append({
-      "city" : loc.city,
-      "state" : loc.state,
-      "venues" : venue_names
-    })
-  return render_template('pages/venues.html', areas=data)
+  filters = catalog_filter_args()
+  facets = genre_facets(Venue, filter_catalog(Venue, Venue.query, **filters))
+  return render_template('pages/venues.html', areas=venue_directory(**filters),
+    facets=genre_facet_links('venues', facets, filters))
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term = request.form.get('search_term', '').upper() #case insesitive 
-  venues = Venue.query.all() 
-  results = []
-  count = 0
-  for ven in venues:
-    current_name = ven.name.upper()
-    if (current_name.find(search_term) != -1):
-      count += 1
-      results.append(ven)
-
-  response = {
-   "count" : count,
-   "data" : results 
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  filters = catalog_filter_args()
+  response = search_catalog(Venue, request.form.get('search_term', ''), page=request.form.get('page', 1, type=int), **filters)
+  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''), filters=filters)
 
 @app.route('/venues/<int:venue_id>')
+@conditional_page(venue_version)
+@cached_page('venue', lambda venue_id: str(venue_id))
 def show_venue(venue_id):
    
-  data_v = Venue.query.get(venue_id)
-  shows = Show.query.filter_by(venue_id=venue_id)
-  upcoming_shows = []
-  past_shows_list = []
-
-  for show in shows:
-    if (datetime.now() > show.start_time): # must be a past show
-      past_shows_list.append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": format_datetime(str(show.start_time))
-      })
-    else: # add to upcoming shows
-      upcoming_shows.append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": format_datetime(str(show.start_time))  
-      })
+  data_v, past_shows_list, upcoming_shows, suggested = load_details(Venue, venue_id, Artist, datetime.now())
 
   data = {
     "id": data_v.id,
@@ -196,7 +1104,9 @@ def show_venue(venue_id):
     "past_shows" : past_shows_list,
     "past_shows_count": len(past_shows_list),
     "upcoming_shows": upcoming_shows,
-    "upcoming_shows_count": len(upcoming_shows)
+    "upcoming_shows_count": len(upcoming_shows),
+    "similar_venues": suggested['similar_venues'],
+    "suggested_artists": suggested['artists_for_venue']
   }
   return render_template('pages/show_venue.html', venue=data)
 
@@ -273,10 +1183,14 @@ def delete_venue_submission(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional_page(artists_version)
+@cached_page('artists', query_key('genre', 'match', 'city', 'state'))
 def artists():
   # DONE: replace with real data returned from querying the database
-  data = Artist.query.all()
-  return render_template('pages/artists.html', artists=data)
+  filters = catalog_filter_args()
+  query = filter_catalog(Artist, Artist.query, **filters)
+  return render_template('pages/artists.html', artists=query.order_by(Artist.id).all(),
+    facets=genre_facet_links('artists', genre_facets(Artist, query), filters))
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
@@ -284,53 +1198,19 @@ def search_artists():
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
 
-  search_term = request.form.get('search_term', '').upper()
-  artists = Artist.query.all() 
-  results = []
-  count = 0
-  for art in artists:
-    current_name = art.name.upper()
-    if (current_name.find(search_term) != -1):
-      count += 1
-      results.append(art)
-
-  response = {
-   "count" : count,
-   "data" : results 
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  filters = catalog_filter_args()
+  response = search_catalog(Artist, request.form.get('search_term', ''), page=request.form.get('page', 1, type=int), **filters)
+  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''), filters=filters)
 
 @app.route('/artists/<int:artist_id>')
+@conditional_page(artist_version)
+@cached_page('artist', lambda artist_id: str(artist_id))
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # DONE: replace with real venue data from the venues table, using venue_id
 
-  data_v = Artist.query.get(artist_id)
-  
-  shows = Show.query.filter_by(artist_id=artist_id)
-
-  upcoming_shows = []
-  past_shows_list = []
+  data_v, past_shows_list, upcoming_shows, suggested = load_details(Artist, artist_id, Venue, datetime.now())
 
-  past_shows_count = 0
-  for show in shows:
-    if (datetime.now() > show.start_time): #must be in the past
-      past_shows_list.append({
-      "artist_id": show.artist_id,
-      "venue_id" : show.venue_id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": format_datetime(str(show.start_time))
-      })
-      past_shows_count += 1
-    else: # future show
-      upcoming_shows.append({
-      "artist_id": show.artist_id,
-      "venue_id" : show.venue_id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": format_datetime(str(show.start_time))
-      })
   data = {
     "id": data_v.id,
     "name": data_v.name,
@@ -344,8 +1224,11 @@ def show_artist(artist_id):
     "seeking_description": data_v.seeking_description,
     "image_link": data_v.image_link,
     "past_shows" : past_shows_list,
-    "past_shows_count": past_shows_count,
-    "upcoming_shows": upcoming_shows
+    "past_shows_count": len(past_shows_list),
+    "upcoming_shows": upcoming_shows,
+    "upcoming_shows_count": len(upcoming_shows),
+    "similar_artists": suggested['similar_artists'],
+    "suggested_venues": suggested['venues_for_artist']
   }
 
   return render_template('pages/show_artist.html', artist=data)
@@ -503,23 +1386,47 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 @app.route('/shows')
+@conditional_page(shows_version)
+@cached_page('shows', query_key('past', 'cursor', 'limit', 'start', 'end', 'venue_id', 'city', 'state'))
 def shows():
   # displays list of shows at /shows
   # DONE: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
-  all_shows = Show.query.all()
+  upcoming_only = request.args.get('past') is None
+  rows, next_cursor = shows_page(datetime.now())
+  next_url = url_for('shows', **dict(request.args.items(), cursor=next_cursor)) if next_cursor else None
   data=[]
-  
-  for show in all_shows: 
+
+  for show in rows:
     data.append({
       "venue_id" : show.venue_id,
-      "venue_name": show.venue.name, 
-      "artist_id": show.artist_id, 
-      "artist_name": show.artist.name, 
-      "artist_image_link": show.artist.image_link,
-      "start_time": format_datetime(str(show.start_time))
+      "venue_name": show.venue_name,
+      "venue_updated_at": show.venue_updated_at,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "artist_updated_at": show.artist_updated_at,
+      "start_time": show.start_time
     })
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data, next_url=next_url, upcoming_only=upcoming_only)
+
+@app.route('/shows/feed')
+def shows_feed():
+  # same feed as /shows, as JSON
+  rows, next_cursor = show_feed(datetime.now(), request.args.get('cursor'),
+    request.args.get('limit', type=int), request.args.get('past') is None, **show_range_args())
+  return jsonify({
+    "data" : [{
+      "id" : show.id,
+      "venue_id" : show.venue_id,
+      "venue_name": show.venue_name,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time.isoformat()
+    } for show in rows],
+    "next_cursor" : next_cursor
+  })
 
 @app.route('/shows/create')
 def create_shows():
@@ -533,15 +1440,37 @@ def create_show_submission():
   # DONE: insert form data as a new Show record in the db, instead
 
   try:
+    start_time = dateutil.parser.parse(request.form['start_time'])
+    if request.form.get('end_time'):
+      end_time = dateutil.parser.parse(request.form['end_time'])
+    else:
+      end_time = start_time + timedelta(hours=app.config['SHOW_DEFAULT_DURATION_HOURS'])
+    if end_time <= start_time:
+      flash('The show could not be listed: it must end after it starts.')
+      return render_template('pages/home.html')
+    lock_bookings(request.form['venue_id'], request.form['artist_id'])
+    conflicts = booking_conflicts(request.form['venue_id'], request.form['artist_id'], start_time, end_time)
+    if conflicts:
+      flash('The show could not be listed: the venue or artist is already booked for a show at ' +
+        format_datetime(conflicts[0].start_time, 'full') + '.')
+      return render_template('pages/home.html')
     show = Show(  #Try to create a new Show object and add to the db
       venue_id = request.form['venue_id'],
       artist_id = request.form['artist_id'],
-      start_time = request.form['start_time']
+      start_time = start_time,
+      end_time = end_time
     )
     db.session.add(show)
     db.session.commit()
     # on successful db insert, flash success
     flash('Show was successfully listed!')
+  except IntegrityError as e:
+    db.session.rollback()
+    if getattr(e.orig, 'pgcode', None) == '23P01': # exclusion_violation: booked concurrently
+      flash('The show could not be listed: the venue or artist was just booked for that time.')
+    else:
+      flash('An error occurred, the show could not be listed.')
+    print(sys.exc_info())
   except:
     # DONE: on unsuccessful db insert, flash an error instead.
     db.session.rollback()
@@ -551,6 +1480,175 @@ def create_show_submission():
     db.session.close()
   return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<kind>.<format>')
+def export(kind, format):
+  if kind not in CATALOG_MODELS or format not in exporter.FORMATS:
+    abort(404)
+  columns, rows = export_rows(kind)
+  chunks = exporter.export_chunks(rows, columns, format)
+  filename = kind + '.' + format
+  mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+  if request.args.get('gzip', 0, type=int):
+    chunks = exporter.gzip_chunks(chunks)
+    filename += '.gz'
+    mimetype = 'application/gzip'
+  return Response(stream_with_context(chunks), mimetype=mimetype,
+    headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/metrics')
+def metrics_endpoint():
+  return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+#  API
+#  ----------------------------------------------------------------
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def api_default(value):
+  # datetimes go out as isoformat() whichever encoder is installed; orjson
+  # would otherwise write them itself and json would fall back to str()
+  if hasattr(value, 'isoformat'):
+    return value.isoformat()
+  return str(value)
+
+def api_response(payload, status=200):
+  if orjson is not None:
+    body = orjson.dumps(payload, default=api_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+  else:
+    body = json.dumps(payload, separators=(',', ':'), default=api_default)
+  return Response(body, status=status, mimetype='application/json')
+
+def api_limit():
+  # ?limit= page size, between 1 and API_MAX_PAGE_SIZE
+  limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+  return max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+def api_columns(model):
+  # ?fields=id,name selects a sparse fieldset; id is always included
+  columns = {column.name: column for column in model.__table__.columns if column.name != 'search_vector'}
+  fields = request.args.get('fields')
+  if not fields:
+    return list(columns.values())
+  names = ['id'] + [name for name in fields.split(',') if name and name != 'id']
+  unknown = [name for name in names if name not in columns]
+  if unknown:
+    abort(400, 'Unknown fields: ' + ', '.join(unknown))
+  return [columns[name] for name in names]
+
+def api_ids():
+  try:
+    ids = [int(id) for id in request.args['ids'].split(',') if id]
+  except ValueError:
+    abort(400, 'ids must be a comma separated list of integers')
+  if len(ids) > app.config['API_MAX_PAGE_SIZE']:
+    abort(400, 'At most {} ids per request'.format(app.config['API_MAX_PAGE_SIZE']))
+  return ids
+
+@api.route('/<resource>')
+def api_list(resource):
+  # one page in id order, or exactly the requested ?ids= in a single IN query
+  model = CATALOG_MODELS.get(resource) or abort(404)
+  columns = api_columns(model)
+  names = [column.name for column in columns]
+  query = db.session.query(*columns)
+
+  if 'ids' in request.args:
+    rows = query.filter(model.id.in_(api_ids())).order_by(model.id).all()
+    return api_response({"data": [dict(zip(names, row)) for row in rows]})
+
+  limit = api_limit()
+  cursor = request.args.get('cursor', type=int)
+  if cursor is not None:
+    query = query.filter(model.id > cursor)
+  rows = query.order_by(model.id).limit(limit + 1).all()
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = rows[-1].id
+  return api_response({
+    "data": [dict(zip(names, row)) for row in rows],
+    "next_cursor": next_cursor
+  })
+
+@api.route('/<resource>/<int:id>')
+def api_detail(resource, id):
+  model = CATALOG_MODELS.get(resource) or abort(404)
+  columns = api_columns(model)
+  row = db.session.query(*columns).filter(model.id == id).first() or abort(404)
+  return api_response({"data": dict(zip([column.name for column in columns], row))})
+
+@api.route('/venues/available')
+def api_available_venues():
+  # ?start=&end= (ISO 8601), optionally narrowed by ?city= and ?state=
+  try:
+    start = datetime.fromisoformat(request.args['start'])
+    end = datetime.fromisoformat(request.args['end'])
+  except (KeyError, ValueError):
+    abort(400, 'start and end must be ISO 8601 datetimes')
+  if end <= start:
+    abort(400, 'end must be after start')
+  limit = api_limit()
+  rows = available_venues(start, end, request.args.get('city'), request.args.get('state'),
+    request.args.get('cursor', type=int), limit + 1)
+  next_cursor = rows[limit - 1].id if len(rows) > limit else None
+  return api_response({
+    "data": [{"id": row.id, "name": row.name, "city": row.city, "state": row.state} for row in rows[:limit]],
+    "next_cursor": next_cursor
+  })
+
+@api.route('/venues/near')
+def api_venues_near():
+  # ?lat=&lon= in degrees and ?km= radius; venues without upcoming shows are
+  # left out unless ?all=1
+  latitude = request.args.get('lat', type=float)
+  longitude = request.args.get('lon', type=float)
+  if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+    abort(400, 'lat and lon must be coordinates in degrees')
+  km = request.args.get('km', app.config['NEAR_DEFAULT_KM'], type=float)
+  if not 0 < km <= app.config['NEAR_MAX_KM']:
+    abort(400, 'km must be more than 0 and at most {}'.format(app.config['NEAR_MAX_KM']))
+  limit = api_limit()
+  rows = venues_near(latitude, longitude, km, request.args.get('all') is None, limit)
+  shows = next_shows([row.id for row in rows], datetime.now()) if rows else {}
+  return api_response({"data": [{
+    "id": row.id,
+    "name": row.name,
+    "address": row.address,
+    "city": row.city,
+    "state": row.state,
+    "latitude": row.latitude,
+    "longitude": row.longitude,
+    "distance_km": round(row.distance / 1000, 3),
+    "upcoming_shows_count": row.upcoming_shows_count,
+    "next_show": {
+      "artist_id": shows[row.id].artist_id,
+      "artist_name": shows[row.id].artist_name,
+      "start_time": shows[row.id].start_time
+    } if row.id in shows else None
+  } for row in rows]})
+
+@api.route('/shows/calendar')
+def api_show_calendar():
+  # ?bucket=day|week|month, optional ?by=venue|city, plus the show range filters
+  bucket = request.args.get('bucket', 'day')
+  by = request.args.get('by')
+  if bucket not in CALENDAR_BUCKETS or by not in (None, 'venue', 'city'):
+    abort(400, 'bucket must be day, week or month and by venue or city')
+  rows = show_calendar(bucket, by, **show_range_args())
+  return api_response({"data": [dict(row._asdict()) for row in rows]})
+
+@api.errorhandler(HTTPException)
+def api_error(error):
+  return api_response({"error": error.description}, error.code)
+
+app.register_blueprint(api)
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -569,6 +1667,190 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def form_data(row):
+  # turn a CSV/JSONL row into the form data the create forms expect
+  data = MultiDict()
+  for name, value in row.items():
+    if name == 'genres' and isinstance(value, str):
+      value = [genre.strip() for genre in value.split(',') if genre.strip()]
+    if isinstance(value, list):
+      data.setlist(name, [str(v) for v in value])
+    elif isinstance(value, bool):
+      data[name] = 'true' if value else 'false'
+    elif value is not None:
+      data[name] = str(value)
+  return data
+
+def venue_record(form):
+  return {
+    "name" : form.name.data,
+    "genres" : form.genres.data,
+    "address" : form.address.data,
+    "city" : form.city.data,
+    "state" : form.state.data,
+    "phone" : form.phone.data,
+    "facebook_link" : form.facebook_link.data,
+    "website" : form.website.data,
+    "image_link" : form.image_link.data,
+    "seeking_talent" : form.seeking_artist.data,
+    "seeking_description" : form.seeking_description.data
+  }
+
+def artist_record(form):
+  return {
+    "name" : form.name.data,
+    "genres" : form.genres.data,
+    "city" : form.city.data,
+    "state" : form.state.data,
+    "phone" : form.phone.data,
+    "facebook_link" : form.facebook_link.data,
+    "website" : form.website.data,
+    "image_link" : form.image_link.data,
+    "seeking_venue" : form.seeking_venue.data,
+    "seeking_description" : form.seeking_description.data
+  }
+
+def show_record(form):
+  return {
+    "venue_id" : int(form.venue_id.data),
+    "artist_id" : int(form.artist_id.data),
+    "start_time" : form.start_time.data,
+    "end_time" : form.end_time.data or
+      form.start_time.data + timedelta(hours=app.config['SHOW_DEFAULT_DURATION_HOURS'])
+  }
+
+IMPORTS = {
+  'venues' : (Venue, VenueForm, venue_record),
+  'artists' : (Artist, ArtistForm, artist_record),
+  'shows' : (Show, ShowForm, show_record)
+}
+
+# exported columns whose form field has another name
+IMPORT_FIELDS = {
+  'venues' : {'seeking_talent': 'seeking_artist'}
+}
+
+def import_validator(kind):
+  # validate(row) for import_rows: the row goes through the same form as the
+  # create pages; needs a request context
+  form_class, to_record = IMPORTS[kind][1:]
+  fields = IMPORT_FIELDS.get(kind, {})
+
+  def validate(row):
+    row = {fields.get(name, name): value for name, value in row.items()}
+    form = form_class(formdata=form_data(row), meta={'csrf': False})
+    if not form.validate():
+      return None, form.errors
+    try:
+      return to_record(form), None
+    except ValueError as e:
+      return None, {"row": [str(e)]}
+  return validate
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per transaction.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and import from the first row.')
+def import_command(kind, path, batch_size, restart):
+  """Bulk import venues, artists or shows from a CSV or JSONL file."""
+  model = IMPORTS[kind][0]
+  validate = import_validator(kind)
+
+  def insert_batch(records):
+    # one executemany per batch instead of a flush per ORM object
+    try:
+      db.session.execute(model.__table__.insert(), records)
+      db.session.commit()
+    except:
+      db.session.rollback()
+      raise
+
+  with app.test_request_context():
+    inserted, rejected, skipped = import_rows(path, validate, insert_batch, batch_size, restart,
+      row_errors=(IntegrityError, DataError))
+  # core inserts bypass the model events that keep show counters and the
+  # page cache up to date
+  if kind == 'shows':
+    refresh_show_counts(datetime.now())
+  if response_cache is not None:
+    response_cache.clear()
+  click.echo('{} {} imported, {} rejected (see {}.errors.jsonl), {} skipped from an earlier run.'.format(
+    inserted, kind, rejected, path, skipped))
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(CATALOG_MODELS)))
+@click.option('--format', 'format', type=click.Choice(exporter.FORMATS), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('-o', '--output', type=click.File('wb'), default='-', help='Output file, stdout by default.')
+def export_command(kind, format, compress, output):
+  """Stream venues, artists or shows out as CSV or JSONL."""
+  columns, rows = export_rows(kind)
+  chunks = exporter.export_chunks(rows, columns, format)
+  if compress:
+    chunks = exporter.gzip_chunks(chunks)
+  for chunk in chunks:
+    output.write(chunk)
+
+@app.cli.command('refresh-show-counts')
+@click.option('--window', default=3600, show_default=True,
+  help='Seconds to look back for shows that moved from upcoming to past; run at least this often.')
+@click.option('--all', 'everything', is_flag=True, help='Recompute the counters of every venue and artist.')
+def refresh_show_counts_command(window, everything):
+  """Move started shows from the upcoming to the past counters."""
+  now = datetime.now()
+  refresh_show_counts(now, None if everything else now - timedelta(seconds=window))
+  if response_cache is not None:
+    response_cache.delete('venues')
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+  """Compile all templates into the bytecode cache."""
+  click.echo('{} templates compiled.'.format(len(precompile_templates())))
+
+@app.cli.command('build-assets')
+def build_assets_command():
+  """Bundle, fingerprint and precompress the CSS and JS."""
+  for bundle, filename in sorted(assets.build(app.static_folder).items()):
+    click.echo('{} -> {}/{}'.format(bundle, assets.DIST, filename))
+
+@app.cli.command('geocode-venues')
+@click.option('--batch-size', default=100, show_default=True, help='Venues geocoded per transaction.')
+@click.option('--all', 'everything', is_flag=True, help='Geocode every venue again, not only new or moved ones.')
+def geocode_venues_command(batch_size, everything):
+  """Fill in venue coordinates for the proximity search."""
+  located, unknown, failed = geocode_venues(batch_size, everything)
+  click.echo('{} venues located, {} unknown places, {} failed (retried next run).'.format(located, unknown, failed))
+
+@app.cli.command('recommend')
+@click.option('--top', default=None, type=int, help='Suggestions kept per venue or artist and kind.')
+@click.option('--genre-weight', default=None, type=float, help='Weight of genre overlap against shared bookings.')
+@click.option('--chunk-size', default=1024, show_default=True, help='Rows scored at a time; bounds memory.')
+def recommend_command(top, genre_weight, chunk_size):
+  """Precompute similar artists and venues and booking suggestions."""
+  stored = refresh_recommendations(top or app.config['RECOMMENDATIONS_TOP'],
+    app.config['RECOMMENDATIONS_GENRE_WEIGHT'] if genre_weight is None else genre_weight, chunk_size)
+  # core inserts bypass the page cache invalidation
+  if response_cache is not None:
+    response_cache.delete('venue')
+    response_cache.delete('artist')
+  click.echo('{} recommendations stored.'.format(stored))
+
+@app.cli.command('create-show-partitions')
+@click.option('--months', default=12, show_default=True, help='How many months ahead to cover.')
+def create_show_partitions_command(months):
+  """Create the monthly Show partitions for the coming months."""
+  start = datetime.now().replace(day=1)
+  for offset in range(months + 1):
+    year, month = divmod(start.month - 1 + offset, 12)
+    db.session.execute(text('SELECT "Show_ensure_partition"(:month)'),
+      {'month': start.replace(year=start.year + year, month=month + 1).date()})
+  db.session.commit()
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
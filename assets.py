@@ -0,0 +1,109 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import posixpath
+
+try:
+    import brotli  # optional, adds .br variants next to the .gz ones
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#
+# build() concatenates each bundle's sources into one file under static/dist
+# named after a hash of its content, writes gzip (and brotli, if installed)
+# variants next to it, and records the names in static/dist/manifest.json.
+# Since a changed file gets a new name, the bundles can be cached forever.
+#
+# CSS is minified here; the JS sources are either already minified vendor
+# builds or a few hundred bytes, so they are only concatenated.
+#----------------------------------------------------------------------------#
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred; runs after jQuery, which is still loaded from its CDN
+    'app.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def absolute_css_urls(css, source):
+    # bundles live in another directory than their sources, so relative
+    # url()s are rewritten to absolute /static/ paths
+    def rewrite(match):
+        url = match.group(2)
+        if re.match(r'^(/|data:|https?:|#)', url):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return 'url("/static/{}")'.format(path)
+    return CSS_URL.sub(rewrite, css)
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def bundle(static_dir, name, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+            content = f.read()
+        if name.endswith('.css'):
+            content = absolute_css_urls(content, source)
+        parts.append(content)
+    if name.endswith('.css'):
+        return minify_css('\n'.join(parts))
+    return ';\n'.join(parts)
+
+
+def build(static_dir):
+    dist = os.path.join(static_dir, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in sorted(BUNDLES.items()):
+        content = bundle(static_dir, name, sources).encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        filename = '{}.{}{}'.format(stem, hashlib.sha256(content).hexdigest()[:12], ext)
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as f:
+            f.write(content)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, 9))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+        manifest[name] = filename
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_dir):
+    try:
+        with open(os.path.join(static_dir, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
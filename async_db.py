@@ -0,0 +1,71 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import TimeoutError
+
+#----------------------------------------------------------------------------#
+# Async queries.
+#
+# Runs independent SELECTs concurrently on SQLAlchemy's asyncio engine
+# (asyncpg). The engine lives on one event loop per worker process, running
+# in a background thread, so its connection pool is reused across requests;
+# the (synchronous) views hand it statements and wait for all the results.
+#
+# The engine is separate from the Flask-SQLAlchemy session: it has its own
+# pool (a second pool_size + max_overflow per worker), always talks to
+# ASYNC_DATABASE_URL and knows nothing about read replicas or query stats.
+# Callers choose when to use it and report timings through on_query.
+#
+# Needs SQLAlchemy 1.4+ and asyncpg, which are only imported when enabled.
+#----------------------------------------------------------------------------#
+
+class AsyncDatabase(object):
+
+    def __init__(self, url, timeout=30, **engine_options):
+        self.url = url
+        self.timeout = timeout
+        self.engine_options = engine_options
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _start(self):
+        # started lazily, and again in each forked worker: neither the loop
+        # thread nor the pooled connections survive a fork
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            from sqlalchemy.ext.asyncio import create_async_engine
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='async-db', daemon=True).start()
+            self._engine = create_async_engine(self.url, **self.engine_options)
+            self._pid = os.getpid()
+
+    async def _fetch(self, statement):
+        # one connection per statement; a single connection cannot run two
+        # queries at once
+        async with self._engine.connect() as conn:
+            start = time.perf_counter()
+            result = await conn.execute(statement)
+            return result.fetchall(), time.perf_counter() - start
+
+    async def _gather(self, statements):
+        return await asyncio.gather(*[self._fetch(statement) for statement in statements])
+
+    def gather(self, *statements, on_query=None):
+        # rows for every statement, in order, with the queries in flight
+        # together; on_query(statement, seconds) is called for each, in the
+        # caller's thread
+        if self._pid != os.getpid():
+            self._start()
+        future = asyncio.run_coroutine_threadsafe(self._gather(statements), self._loop)
+        try:
+            results = future.result(self.timeout)
+        except TimeoutError:
+            # stop the queries instead of leaving them to hold connections
+            future.cancel()
+            raise
+        if on_query is not None:
+            for statement, (rows, duration) in zip(statements, results):
+                on_query(str(statement), duration)
+        return [rows for rows, duration in results]
@@ -0,0 +1,248 @@
+#----------------------------------------------------------------------------#
+# Benchmark.
+#
+# Seeds a scratch database with a synthetic catalog, drives every page
+# through the Flask test client and reports latency percentiles, queries per
+# request and peak RSS. Results can be saved as a JSON baseline and later
+# runs compared against it:
+#
+#   python benchmark.py --database-url postgresql://localhost/fyyur_bench \
+#       --scale 100k --write-baseline bench_baseline.json
+#   python benchmark.py --database-url ... --scale 100k --baseline bench_baseline.json
+#
+# The schema is dropped and rebuilt with the migrations (flask db upgrade),
+# never point it at real data.
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from geocoding import OfflineGeocoder
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+          'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+          'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+CITIES = [('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN'), ('New Orleans', 'LA'),
+          ('Portland', 'OR'), ('Denver', 'CO'), ('Boston', 'MA'), ('Atlanta', 'GA')]
+CENTROIDS = OfflineGeocoder.CENTROIDS
+WORDS = ['Musical', 'Hop', 'Park', 'Square', 'Live', 'Coffee', 'Wild', 'Sax', 'Band', 'Blue',
+         'Velvet', 'Room', 'Hall', 'Garden', 'Cellar', 'Lounge', 'Echo', 'Neon', 'Groove']
+
+
+def catalog_sizes(shows):
+    return max(shows // 20, 10), max(shows // 10, 10), shows
+
+
+def synthetic_name(rng):
+    return ' '.join(rng.sample(WORDS, 3))
+
+
+def generate(db, Venue, Artist, Show, shows, batch_size=10000, seed=42):
+    rng = random.Random(seed)
+    venue_count, artist_count, show_count = catalog_sizes(shows)
+    now = datetime.now()
+
+    # a monthly partition for every month the shows span, so none of them
+    # lands in Show_default
+    month = (now - timedelta(days=366)).replace(day=1).date()
+    while month <= (now + timedelta(days=366)).date():
+        db.session.execute(text('SELECT "Show_ensure_partition"(:month)'), {'month': month})
+        month = (month + timedelta(days=32)).replace(day=1)
+    db.session.commit()
+
+    def insert(table, make, count):
+        for start in range(0, count, batch_size):
+            db.session.execute(table.insert(), [make(i) for i in range(start, min(start + batch_size, count))])
+            db.session.commit()
+
+    def venue(i):
+        city, state = rng.choice(CITIES)
+        # spread around the city centre, roughly within 20 km
+        latitude, longitude = CENTROIDS[(city.lower(), state.lower())]
+        return dict(name=synthetic_name(rng), genres=rng.sample(GENRES, 2), city=city, state=state,
+                    latitude=latitude + rng.uniform(-0.2, 0.2), longitude=longitude + rng.uniform(-0.2, 0.2),
+                    geocoded_at=now,
+                    address='{} Main St'.format(i), phone='555-555-{:04d}'.format(i % 10000),
+                    image_link='https://example.com/venues/{}.jpg'.format(i),
+                    facebook_link='https://www.facebook.com/venue{}'.format(i),
+                    website='https://venue{}.example.com'.format(i),
+                    seeking_talent=rng.random() < 0.5, seeking_description='')
+
+    def artist(i):
+        city, state = rng.choice(CITIES)
+        return dict(name=synthetic_name(rng), genres=rng.sample(GENRES, 2), city=city, state=state,
+                    phone='555-555-{:04d}'.format(i % 10000),
+                    image_link='https://example.com/artists/{}.jpg'.format(i),
+                    facebook_link='https://www.facebook.com/artist{}'.format(i),
+                    website='https://artist{}.example.com'.format(i),
+                    seeking_venue=rng.random() < 0.5, seeking_description='')
+
+    # bookings may not overlap for a venue or an artist: show i plays venue
+    # i % venue_count and artist i % artist_count in time slot i // venue_count.
+    # Shows sharing a venue or an artist are at least venue_count apart, so
+    # they never share a slot, and a show never runs past its own slot.
+    slots = -(-show_count // venue_count)
+    slot_hours = 2 * 24 * 365 // slots
+    first = now - timedelta(days=365)
+
+    def show(i):
+        start_time = first + timedelta(hours=(i // venue_count) * slot_hours + rng.randint(0, slot_hours - 4))
+        return dict(venue_id=i % venue_count + 1, artist_id=i % artist_count + 1,
+                    start_time=start_time, end_time=start_time + timedelta(hours=3))
+
+    insert(Venue.__table__, venue, venue_count)
+    insert(Artist.__table__, artist, artist_count)
+    insert(Show.__table__, show, show_count)
+    return venue_count, artist_count, show_count
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(int(round(p / 100.0 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def scenarios(venue_count, artist_count, rng):
+    venue_id = lambda: rng.randint(1, venue_count)
+    artist_id = lambda: rng.randint(1, artist_count)
+    venue_form = lambda: {
+        'name': 'Bench Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Bench St',
+        'phone': '555-555-0000', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/bench',
+        'website': 'https://bench.example.com', 'image_link': 'https://example.com/bench.jpg',
+        'seeking_description': ''}
+    artist_form = lambda: dict(venue_form(), name='Bench Artist')
+    near = lambda: dict(zip(('lat', 'lon'), rng.choice(sorted(CENTROIDS.values()))), km=10)
+    return [
+        ('venues', lambda c: c.get('/venues')),
+        ('show_venue', lambda c: c.get('/venues/{}'.format(venue_id()))),
+        ('search_venues', lambda c: c.post('/venues/search', data={'search_term': rng.choice(WORDS)})),
+        ('venues_near', lambda c: c.get('/api/v1/venues/near', query_string=near())),
+        ('venues_by_genre', lambda c: c.get('/venues', query_string={'genre': rng.choice(GENRES), 'state': 'CA'})),
+        ('artists', lambda c: c.get('/artists')),
+        ('show_artist', lambda c: c.get('/artists/{}'.format(artist_id()))),
+        ('search_artists', lambda c: c.post('/artists/search', data={'search_term': rng.choice(WORDS)})),
+        ('shows', lambda c: c.get('/shows')),
+        ('create_venue_submission', lambda c: c.post('/venues/create', data=venue_form())),
+        ('edit_artist_submission', lambda c: c.post('/artists/{}/edit'.format(artist_id()), data=artist_form())),
+        ('create_show_submission', lambda c: c.post('/shows/create', data={
+            'venue_id': venue_id(), 'artist_id': artist_id(),
+            'start_time': (datetime.now() + timedelta(days=rng.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S')})),
+    ]
+
+
+def run(client, venue_count, artist_count, requests, seed=42):
+    rng = random.Random(seed)
+    queries = []
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def count_query(*args):
+        queries.append(1)
+
+    results = {}
+    for name, call in scenarios(venue_count, artist_count, rng):
+        latencies = []
+        query_counts = []
+        for _ in range(requests):
+            del queries[:]
+            start = time.perf_counter()
+            response = call(client)
+            latencies.append((time.perf_counter() - start) * 1000)
+            query_counts.append(len(queries))
+            if response.status_code >= 500:
+                raise RuntimeError('{} returned {}'.format(name, response.status_code))
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_per_request': round(sum(query_counts) / float(len(query_counts)), 2),
+        }
+    event.remove(Engine, 'after_cursor_execute', count_query)
+    return results
+
+
+def compare(report, baseline, tolerance):
+    # a route regresses when its p50 is more than `tolerance` slower or it
+    # issues more queries than the baseline did
+    regressions = []
+    for name, result in report['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        if result['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            regressions.append('{}: p50 {}ms -> {}ms'.format(name, before['p50_ms'], result['p50_ms']))
+        if result['queries_per_request'] > before['queries_per_request']:
+            regressions.append('{}: queries {} -> {}'.format(
+                name, before['queries_per_request'], result['queries_per_request']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Fyyur pages against a synthetic catalog.')
+    parser.add_argument('--database-url', required=True, help='Scratch PostgreSQL database, it is wiped.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k', help='Number of shows to generate.')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per route.')
+    parser.add_argument('--cache', action='store_true', help='Keep the response cache enabled.')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse the catalog from a previous run.')
+    parser.add_argument('--baseline', help='Compare against this JSON baseline.')
+    parser.add_argument('--write-baseline', help='Save the report as a JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p50 slowdown, 0.2 = 20%%.')
+    args = parser.parse_args(argv)
+
+    import app as fyyur
+    fyyur.app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    fyyur.app.config['TESTING'] = True
+    if not args.cache:
+        fyyur.response_cache = None
+
+    with fyyur.app.app_context():
+        db = fyyur.db
+        if args.skip_seed:
+            venue_count, artist_count, _ = catalog_sizes(SCALES[args.scale])
+        else:
+            # migrations, not create_all: partitions, exclusion constraints,
+            # triggers and indexes only exist there
+            db.session.execute(text('DROP SCHEMA public CASCADE; CREATE SCHEMA public'))
+            db.session.commit()
+            upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+            start = time.perf_counter()
+            venue_count, artist_count, show_count = generate(
+                db, fyyur.Venue, fyyur.Artist, fyyur.Show, SCALES[args.scale])
+            fyyur.refresh_show_counts(datetime.now())
+            print('seeded {} venues, {} artists, {} shows in {:.1f}s'.format(
+                venue_count, artist_count, show_count, time.perf_counter() - start), file=sys.stderr)
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+
+    routes = run(fyyur.app.test_client(), venue_count, artist_count, args.requests)
+    report = {
+        'scale': args.scale,
+        'requests_per_route': args.requests,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'routes': routes,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.write_baseline:
+        with open(args.write_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
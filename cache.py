@@ -0,0 +1,189 @@
+import os
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+#----------------------------------------------------------------------------#
+# Response cache backends.
+#
+# Entries are addressed by (namespace, key), e.g. ('venue', '12') or
+# ('shows', 'cursor=...'). A whole namespace can be dropped at once, which is
+# how pages with many variants (the paged /shows feed) get invalidated.
+#----------------------------------------------------------------------------#
+
+class MemoryCache(object):
+    # per-process LRU with a TTL; invalidations only reach the worker that
+    # made the change, so use FileSystemCache when running several workers
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._entries[(namespace, key)] = (time.time() + self.ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace, key=None):
+        with self._lock:
+            if key is not None:
+                self._entries.pop((namespace, key), None)
+                return
+            for entry in [e for e in self._entries if e[0] == namespace]:
+                del self._entries[entry]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(object):
+    # one directory per namespace, one file per key; shared by every worker
+    # on the host so an invalidation in one is seen by all. Every
+    # max_entries // 10 writes (per worker) expired entries are removed and
+    # the oldest ones beyond max_entries evicted, which bounds the disk use.
+    def __init__(self, directory, ttl=300, max_entries=1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, namespace, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, namespace, name)
+
+    def get(self, namespace, key):
+        try:
+            with open(self._path(namespace, key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            self.delete(namespace, key)
+            return None
+        return value
+
+    def set(self, namespace, key, value):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file and rename so readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + self.ttl, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes >= max(self.max_entries // 10, 1)
+            if prune:
+                self._writes = 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        # an entry's mtime is when it was written, so it expired when
+        # mtime + ttl has passed
+        now = time.time()
+        entries = []
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    written = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                if written + self.ttl < now:
+                    self._remove(path)
+                else:
+                    entries.append((written, path))
+        entries.sort()
+        for written, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def delete(self, namespace, key=None):
+        if key is None:
+            shutil.rmtree(os.path.join(self.directory, namespace), ignore_errors=True)
+            return
+        self._remove(self._path(namespace, key))
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def create_cache(config):
+    backend = config.get('RESPONSE_CACHE')
+    if backend == 'memory':
+        return MemoryCache(config['RESPONSE_CACHE_TTL'], config['RESPONSE_CACHE_MAX_ENTRIES'])
+    if backend == 'filesystem':
+        return FileSystemCache(config['RESPONSE_CACHE_DIR'], config['RESPONSE_CACHE_TTL'],
+                               config['RESPONSE_CACHE_MAX_ENTRIES'])
+    return None
+
+
+#----------------------------------------------------------------------------#
+# Template fragment cache.
+#
+#   {% cache 'show-tile', show.artist_id, show.artist_updated_at, show.start_time %}
+#     ...
+#   {% endcache %}
+#
+# The rendered block is stored under the tuple of key values, so keys should
+# include the version (updated_at) of every entity the block displays; a
+# change then simply produces a new key and old entries age out of the LRU.
+# Renders normally when environment.fragment_cache is None.
+#----------------------------------------------------------------------------#
+
+class FragmentCacheExtension(Extension):
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached_fragment', [nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = repr(parts)
+        fragment = cache.get('fragment', key)
+        if fragment is None:
+            fragment = caller()
+            cache.set('fragment', key, fragment)
+        return fragment
@@ -0,0 +1,52 @@
+import io
+import csv
+import json
+import zlib
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#
+# Generators that turn an iterable of rows into CSV or JSONL chunks, and
+# optionally gzip them on the fly, so an export never holds more than one
+# chunk in memory. Lists (genres) are written comma separated and booleans
+# as true/false in CSV, which is the form the import command reads back.
+#----------------------------------------------------------------------------#
+
+FORMATS = ('csv', 'jsonl')
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def export_chunks(rows, columns, format, chunk_rows=1000):
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([csv_value(value) for value in row])
+    else:
+        write = lambda row: buffer.write(json.dumps(dict(zip(columns, row)), default=str) + '\n')
+
+    for number, row in enumerate(rows, 1):
+        write(row)
+        if number % chunk_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import Form
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, AnyOf, URL, Optional
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -12,11 +12,18 @@ class ShowForm(Form):
         'venue_id',
         validators=[DataRequired()]
     )
+    # exports write datetimes with microseconds when they have any
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
+        format=['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f'],
         default= datetime.today()
     )
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()],
+        format=['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f']
+    )
 
 class VenueForm(Form):
     name = StringField(
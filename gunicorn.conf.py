@@ -0,0 +1,40 @@
+import os
+import multiprocessing
+
+# gunicorn settings, loaded automatically when gunicorn runs from this
+# directory. Every value can be overridden from the environment.
+
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+
+# Threaded workers: requests spend most of their time waiting on PostgreSQL
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WORKER_THREADS', 4))
+
+# Import the app once in the master and fork workers from it
+preload_app = True
+
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # compile templates once in the master so forked workers start warm
+    from app import precompile_templates
+    precompile_templates()
+
+
+def post_fork(server, worker):
+    # With preload_app the master may already have opened connections (for
+    # example while importing the app); sockets must never be shared between
+    # processes, so every worker starts from an empty pool of its own.
+    from app import app, db, replicas
+    with app.app_context():
+        db.engine.dispose()
+    if replicas is not None:
+        replicas.dispose()
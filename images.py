@@ -0,0 +1,260 @@
+import io
+import os
+import socket
+import hashlib
+import tempfile
+import ipaddress
+import threading
+import posixpath
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlparse
+from urllib.request import Request, HTTPHandler, HTTPSHandler, HTTPRedirectHandler, ProxyHandler, build_opener
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#
+# Remote image_links are fetched once, stored by the hash of their content
+# and resized into WebP (or JPEG) thumbnails on first use:
+#
+#   urls/<sha256 of url>            -> content hash of the original
+#   originals/<content hash>        original bytes
+#   thumbs/<content hash>-<w>.<ext> resized copies
+#
+# The cache directory is bounded by max_bytes: each process keeps a running
+# total of what it wrote, and only when that passes max_bytes does it walk
+# the directory and evict the least recently used files down to 90%.
+# Other workers' writes are picked up by that walk. Needs Pillow; without it `available` is False and pages
+# keep linking the remote images directly.
+#----------------------------------------------------------------------------#
+
+class FetchError(Exception):
+    pass
+
+
+def check_url(url):
+    # image_links are user input: only http(s) urls with a host are fetched
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise FetchError('unsupported url ' + url)
+
+
+def public_addresses(host, port):
+    # getaddrinfo for host, refused unless every address is public, so the
+    # server can't be used to reach loopback, private, link-local (cloud
+    # metadata) or other internal addresses
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError) as e:
+        raise FetchError('cannot resolve {}: {}'.format(host, e))
+    for family, type, proto, canonname, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if getattr(address, 'ipv4_mapped', None):
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise FetchError('refusing non-public address {} for {}'.format(address, host))
+    return addresses
+
+
+def public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    # socket.create_connection that resolves the host once and connects to
+    # exactly the addresses it checked; resolving again to connect would let
+    # a second DNS answer (rebinding) point the request at an internal host
+    host, port = address
+    error = None
+    for family, type, proto, canonname, sockaddr in public_addresses(host, port):
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class PublicHTTPConnection(HTTPConnection):
+
+    def __init__(self, *args, **kwargs):
+        HTTPConnection.__init__(self, *args, **kwargs)
+        self._create_connection = public_connection
+
+
+class PublicHTTPSConnection(HTTPSConnection):
+    # TLS is still set up for self.host: SNI and certificate checks are those
+    # of the name in the url, not of the address connected to
+
+    def __init__(self, *args, **kwargs):
+        HTTPSConnection.__init__(self, *args, **kwargs)
+        self._create_connection = public_connection
+
+
+class PublicHTTPHandler(HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+class PublicRedirectHandler(HTTPRedirectHandler):
+    # redirects stay on http(s); their connections are checked like the first
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_url(newurl)
+        return HTTPRedirectHandler.redirect_request(self, req, fp, code, msg, headers, newurl)
+
+
+class HttpFetcher(object):
+
+    def __init__(self, timeout=10, max_bytes=20 * 1024 * 1024):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        # no proxies: the checked address must be the one connected to
+        self._opener = build_opener(ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler,
+                                    PublicRedirectHandler)
+
+    def fetch(self, url):
+        check_url(url)
+        try:
+            request = Request(url, headers={'User-Agent': 'fyyur-thumbnailer'})
+            with self._opener.open(request, timeout=self.timeout) as response:
+                data = response.read(self.max_bytes + 1)
+        except (OSError, ValueError) as e:
+            raise FetchError(str(e))
+        if len(data) > self.max_bytes:
+            raise FetchError('image too large ' + url)
+        return data
+
+
+class LocalFetcher(object):
+    # offline stand-in: serves <directory>/<sha256 of url>, or failing that
+    # the file named like the last segment of the url's path
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, url):
+        for name in (hashlib.sha256(url.encode('utf-8')).hexdigest(),
+                     posixpath.basename(urlparse(url).path)):
+            path = os.path.join(self.directory, name)
+            if name and os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+        raise FetchError('no local copy of ' + url)
+
+
+class ThumbnailCache(object):
+
+    FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+    def __init__(self, directory, fetcher, max_bytes=512 * 1024 * 1024, quality=80):
+        self.directory = directory
+        self.fetcher = fetcher
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._size = None  # bytes in the directory, from the last walk plus writes since
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        os.utime(path)  # mark as recently used for eviction
+        return data
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            if self._size is None or self._size > self.max_bytes:
+                self._evict()
+
+    def _url_key(self, url):
+        return self._path('urls', hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _original(self, url):
+        # content hash of the image at url, fetching it unless the original
+        # is still cached
+        digest = self._read(self._url_key(url))
+        if digest is not None and os.path.exists(self._path('originals', digest.decode())):
+            return digest.decode()
+        data = self.fetcher.fetch(url)
+        digest = hashlib.sha256(data).hexdigest()
+        self._write(self._path('originals', digest), data)
+        self._write(self._url_key(url), digest.encode())
+        return digest
+
+    def thumbnail(self, url, width, format='webp'):
+        # (path, mimetype) of the url's image scaled to width, keeping the
+        # aspect ratio; raises FetchError when the original can't be fetched
+        name = '{}-{}.' + format
+        digest = self._read(self._url_key(url))
+        if digest is not None:
+            path = self._path('thumbs', name.format(digest.decode(), width))
+            if os.path.exists(path):
+                try:
+                    os.utime(path)  # mark as recently used for eviction
+                    return path, 'image/' + format
+                except OSError:
+                    pass  # evicted meanwhile: make it again
+
+        digest = self._original(url)
+        path = self._path('thumbs', name.format(digest, width))
+        try:
+            image = Image.open(io.BytesIO(self._read(self._path('originals', digest))))
+            image.thumbnail((width, width * 4))
+            if format == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            out = io.BytesIO()
+            image.save(out, self.FORMATS[format], quality=self.quality)
+        except (OSError, ValueError, TypeError) as e:
+            raise FetchError('cannot resize {}: {}'.format(url, e))
+        self._write(path, out.getvalue())
+        return path, 'image/' + format
+
+    def _evict(self):
+        # called with the lock held; evicting below max_bytes leaves room
+        # for many writes before the next walk
+        files = []
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for mtime, size, path in files)
+        if total > self.max_bytes:
+            for mtime, size, path in sorted(files):
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        self._size = total
@@ -0,0 +1,115 @@
+import os
+import csv
+import json
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Streams rows from a CSV or JSONL file, validates each one, and hands valid
+# records to an insert callback in batches. Every committed batch moves a
+# checkpoint file forward so an interrupted import picks up where it stopped,
+# and rejected rows are written to an error report next to the source file.
+#----------------------------------------------------------------------------#
+
+def read_rows(path):
+    # yields (row number, dict) pairs; the row number counts data rows from 1
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield number, row
+    else:
+        with open(path, encoding='utf-8') as f:
+            number = 0
+            for line in f:
+                if line.strip():
+                    number += 1
+                    yield number, json.loads(line)
+
+
+class Checkpoint(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def save(self, number):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(number))
+        os.replace(tmp, self.path)
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_rows(path, validate, insert_batch, batch_size=5000, restart=False, row_errors=()):
+    # validate(row) returns (record, errors); insert_batch(records) inserts
+    # and commits, raising on failure. row_errors are the exceptions that
+    # blame the rows (e.g. IntegrityError); any other failure (a lost
+    # connection) stops the import before the checkpoint moves, so a rerun
+    # picks the batch up again. Returns (inserted, rejected, skipped).
+    checkpoint = Checkpoint(path + '.checkpoint')
+    if restart:
+        checkpoint.reset()
+    done = checkpoint.load()
+    inserted = rejected = 0
+
+    with open(path + '.errors.jsonl', 'a', encoding='utf-8') as report:
+
+        def reject(number, row, errors):
+            report.write(json.dumps({"row": number, "data": row, "errors": errors}, default=str) + '\n')
+
+        def flush(batch):
+            # on failure (e.g. a show pointing at a missing venue) retry the
+            # batch one row at a time so only the offending rows are rejected;
+            # the checkpoint follows every row there, so an import stopped
+            # mid-retry does not insert the rows it already committed again
+            count = 0
+            try:
+                insert_batch([record for number, row, record in batch])
+                count = len(batch)
+            except row_errors:
+                for number, row, record in batch:
+                    try:
+                        insert_batch([record])
+                        count += 1
+                    except row_errors as e:
+                        reject(number, row, {"database": [str(e)]})
+                    report.flush()
+                    checkpoint.save(number)
+            checkpoint.save(batch[-1][0])
+            report.flush()
+            return count
+
+        batch = []
+        last = done
+        for number, row in read_rows(path):
+            last = number
+            if number <= done:
+                continue
+            record, errors = validate(row)
+            if errors:
+                rejected += 1
+                reject(number, row, errors)
+                continue
+            batch.append((number, row, record))
+            if len(batch) >= batch_size:
+                added = flush(batch)
+                inserted += added
+                rejected += len(batch) - added
+                batch = []
+        if batch:
+            added = flush(batch)
+            inserted += added
+            rejected += len(batch) - added
+        if last > done:
+            checkpoint.save(last)
+
+    return inserted, rejected, done
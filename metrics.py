@@ -0,0 +1,69 @@
+import threading
+from collections import Counter, defaultdict
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#
+# RequestStats accumulates what a single request cost (queries, database
+# time, template render time); Metrics aggregates finished requests per
+# endpoint and renders them in the Prometheus text exposition format. Totals
+# are per process.
+#----------------------------------------------------------------------------#
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+
+    def record_query(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold):
+        # the same statement run once per row of an earlier result is the
+        # signature of an N+1 lazy load
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+
+class Metrics(object):
+
+    COUNTERS = [
+        ('requests_total', 'Requests handled.'),
+        ('request_seconds_total', 'Time spent handling requests.'),
+        ('db_queries_total', 'SQL statements executed.'),
+        ('db_seconds_total', 'Time spent executing SQL statements.'),
+        ('render_seconds_total', 'Time spent rendering templates.'),
+        ('n_plus_one_total', 'Requests that repeated a statement past the N+1 threshold.'),
+    ]
+
+    def __init__(self, prefix='fyyur'):
+        self.prefix = prefix
+        self._values = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, duration, stats, n_plus_one=False):
+        with self._lock:
+            values = self._values[endpoint or 'unknown']
+            values['requests_total'] += 1
+            values['request_seconds_total'] += duration
+            values['db_queries_total'] += stats.queries
+            values['db_seconds_total'] += stats.db_time
+            values['render_seconds_total'] += stats.render_time
+            values['n_plus_one_total'] += int(n_plus_one)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, help in self.COUNTERS:
+                metric = '{}_{}'.format(self.prefix, name)
+                lines.append('# HELP {} {}'.format(metric, help))
+                lines.append('# TYPE {} counter'.format(metric))
+                for endpoint in sorted(self._values):
+                    lines.append('{}{{endpoint="{}"}} {}'.format(
+                        metric, endpoint, self._values[endpoint][name]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,72 @@
+"""initial tables
+
+Revision ID: 0c7e19a4d2b8
+Revises: 
+Create Date: 2026-10-18 20:41:16.902345
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0c7e19a4d2b8'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# The tables as they were before d87fc88225fd, which used to be created with
+# db.create_all() before the first migration ran. Existing databases already
+# have them, so each table is only created when missing; this lets
+# `flask db upgrade` build a database (e.g. the benchmark's) from scratch.
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'Venue' not in tables:
+        op.create_table('Venue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('address', sa.String(length=120), nullable=False),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.Column('website', sa.String(length=120), nullable=True),
+        sa.Column('seeking_talent', sa.Boolean(), nullable=True),
+        sa.Column('seeking_description', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'Artist' not in tables:
+        op.create_table('Artist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.Column('website', sa.String(length=120), nullable=True),
+        sa.Column('seeking_venue', sa.Boolean(), nullable=True),
+        sa.Column('seeking_description', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'Show' not in tables:
+        op.create_table('Show',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('Show')
+    op.drop_table('Artist')
+    op.drop_table('Venue')
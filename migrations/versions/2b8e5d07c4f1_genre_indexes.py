@@ -0,0 +1,37 @@
+"""GIN indexes on venue and artist genres
+
+Revision ID: 2b8e5d07c4f1
+Revises: f1c7b3a8e265
+Create Date: 2026-10-18 16:34:12.508913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b8e5d07c4f1'
+down_revision = 'f1c7b3a8e265'
+branch_labels = None
+depends_on = None
+
+
+# serve the genre filters, genres @> ARRAY[...] (all of) and
+# genres && ARRAY[...] (any of)
+INDEXES = [
+    ('ix_Venue_genres', 'Venue'),
+    ('ix_Artist_genres', 'Artist'),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table in INDEXES:
+            op.create_index(name, table, ['genres'], unique=False,
+                            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
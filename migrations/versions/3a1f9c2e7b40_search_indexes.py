@@ -0,0 +1,55 @@
+"""search indexes for venues and artists
+
+Revision ID: 3a1f9c2e7b40
+Revises: d87fc88225fd
+Create Date: 2026-10-18 09:12:04.118273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3a1f9c2e7b40'
+down_revision = 'd87fc88225fd'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION "{table}_search_vector_update"() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "{table}_search_vector_trigger"
+  BEFORE INSERT OR UPDATE OF name, city, state, genres ON "{table}"
+  FOR EACH ROW EXECUTE PROCEDURE "{table}_search_vector_update"();
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(SEARCH_VECTOR_TRIGGER.format(table=table))
+        # fire the trigger once for every existing row
+        op.execute('UPDATE "{table}" SET name = name'.format(table=table))
+        op.create_index('ix_{}_name_trgm'.format(table), table, ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_{}_search_vector'.format(table), table, ['search_vector'], unique=False,
+                        postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{}_search_vector'.format(table), table_name=table)
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
+        op.execute('DROP TRIGGER IF EXISTS "{table}_search_vector_trigger" ON "{table}"'.format(table=table))
+        op.execute('DROP FUNCTION IF EXISTS "{table}_search_vector_update"()'.format(table=table))
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,39 @@
+"""indexes for show and venue lookups
+
+Revision ID: 5e7a0f3c9d12
+Revises: 8c4d2b61e0a7
+Create Date: 2026-10-18 11:20:09.847102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a0f3c9d12'
+down_revision = '8c4d2b61e0a7'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time']),
+    ('ix_Show_start_time_id', 'Show', ['start_time', 'id']),
+    ('ix_Venue_state_city', 'Venue', ['state', 'city']),
+]
+
+
+def upgrade():
+    # built CONCURRENTLY so Show stays writable while the indexes build;
+    # that cannot run inside a transaction, hence the autocommit block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
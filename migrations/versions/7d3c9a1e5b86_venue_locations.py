@@ -0,0 +1,39 @@
+"""venue coordinates and location index
+
+Revision ID: 7d3c9a1e5b86
+Revises: 2b8e5d07c4f1
+Create Date: 2026-10-18 17:48:03.216470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3c9a1e5b86'
+down_revision = '2b8e5d07c4f1'
+branch_labels = None
+depends_on = None
+
+
+# The columns start out empty; `flask geocode-venues` fills them in. The
+# GiST index on ll_to_earth() (cube/earthdistance, both in contrib) serves
+# the earth_box() lookups of /api/v1/venues/near, no PostGIS needed.
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS cube')
+    op.execute('CREATE EXTENSION IF NOT EXISTS earthdistance')
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geocoded_at', sa.DateTime(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY "ix_Venue_location" ON "Venue" '
+                   'USING gist (ll_to_earth(latitude, longitude))')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY "ix_Venue_location"')
+    op.drop_column('Venue', 'geocoded_at')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
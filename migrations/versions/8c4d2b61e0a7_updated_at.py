@@ -0,0 +1,29 @@
+"""updated_at version columns
+
+Revision ID: 8c4d2b61e0a7
+Revises: 3a1f9c2e7b40
+Create Date: 2026-10-18 10:41:37.502916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4d2b61e0a7'
+down_revision = '3a1f9c2e7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows start out as last modified "now" (UTC, like the model default)
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+        op.alter_column(table, 'updated_at', server_default=None)
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'updated_at')
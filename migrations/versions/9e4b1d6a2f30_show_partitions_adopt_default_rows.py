@@ -0,0 +1,86 @@
+"""move default partition rows into new Show partitions
+
+Revision ID: 9e4b1d6a2f30
+Revises: c5a2f8e61d09
+Create Date: 2026-10-18 21:42:10.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b1d6a2f30'
+down_revision = 'c5a2f8e61d09'
+branch_labels = None
+depends_on = None
+
+
+# A show booked past the last monthly partition lands in "Show_default".
+# PostgreSQL then refuses to create that month's partition while the default
+# partition holds rows for it, so `flask create-show-partitions` (one
+# transaction) failed for good. "Show_ensure_partition" now moves those rows
+# out of the default partition, creates the partition and its exclusion
+# constraints, and inserts the rows again, all in the caller's transaction.
+#
+# The exclusion constraints are per partition: two shows in different
+# months are never compared, so a show running past midnight at the end of a
+# month is not checked against one starting early on the 1st. /shows/create
+# covers that gap with booking_conflicts under an advisory lock (see
+# lock_bookings in app.py); imports rely on the constraints alone.
+
+ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION "Show_ensure_partition"(month date) RETURNS void AS $$
+DECLARE
+  first date := date_trunc('month', month)::date;
+  name text := 'Show_' || to_char(first, 'YYYY_MM');
+BEGIN
+  IF to_regclass(quote_ident(name)) IS NOT NULL THEN
+    RETURN;
+  END IF;
+  CREATE TEMP TABLE "Show_moving" ON COMMIT DROP AS
+    SELECT * FROM "Show_default" WHERE false;
+  WITH moved AS (
+    DELETE FROM "Show_default"
+    WHERE start_time >= first AND start_time < first + interval '1 month'
+    RETURNING *
+  )
+  INSERT INTO "Show_moving" SELECT * FROM moved;
+  EXECUTE format('CREATE TABLE %I PARTITION OF "Show" FOR VALUES FROM (%L) TO (%L)',
+                 name, first, first + interval '1 month');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                 '(venue_id WITH =, tsrange(start_time, end_time) WITH &&)', name, name || '_venue_no_overlap');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                 '(artist_id WITH =, tsrange(start_time, end_time) WITH &&)', name, name || '_artist_no_overlap');
+  INSERT INTO "Show" SELECT * FROM "Show_moving";
+  DROP TABLE "Show_moving";
+END
+$$ LANGUAGE plpgsql;
+"""
+
+PREVIOUS_ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION "Show_ensure_partition"(month date) RETURNS void AS $$
+DECLARE
+  first date := date_trunc('month', month)::date;
+  name text := 'Show_' || to_char(first, 'YYYY_MM');
+BEGIN
+  IF to_regclass(quote_ident(name)) IS NOT NULL THEN
+    RETURN;
+  END IF;
+  EXECUTE format('CREATE TABLE %I PARTITION OF "Show" FOR VALUES FROM (%L) TO (%L)',
+                 name, first, first + interval '1 month');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                 '(venue_id WITH =, tsrange(start_time, end_time) WITH &&)', name, name || '_venue_no_overlap');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                 '(artist_id WITH =, tsrange(start_time, end_time) WITH &&)', name, name || '_artist_no_overlap');
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    op.execute(ENSURE_PARTITION)
+
+
+def downgrade():
+    op.execute(PREVIOUS_ENSURE_PARTITION)
@@ -0,0 +1,35 @@
+"""upcoming and past show counters on venues and artists
+
+Revision ID: b6f2e8d4a913
+Revises: 5e7a0f3c9d12
+Create Date: 2026-10-18 13:05:52.660314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f2e8d4a913'
+down_revision = '5e7a0f3c9d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.alter_column(table, 'upcoming_shows_count', server_default=None)
+        op.alter_column(table, 'past_shows_count', server_default=None)
+        op.execute('''
+            UPDATE "{table}" SET
+              upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{key} = "{table}".id AND start_time > now()),
+              past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{key} = "{table}".id AND start_time <= now())
+        '''.format(table=table, key=key))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
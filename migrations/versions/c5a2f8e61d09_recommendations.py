@@ -0,0 +1,35 @@
+"""precomputed recommendations
+
+Revision ID: c5a2f8e61d09
+Revises: 7d3c9a1e5b86
+Create Date: 2026-10-18 19:05:27.640158
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a2f8e61d09'
+down_revision = '7d3c9a1e5b86'
+branch_labels = None
+depends_on = None
+
+
+# Filled by `flask recommend`. The primary key (kind, subject_id, position)
+# is the only index the detail pages need.
+
+def upgrade():
+    op.create_table('Recommendation',
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('candidate_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'subject_id', 'position')
+    )
+
+
+def downgrade():
+    op.drop_table('Recommendation')
@@ -1,7 +1,7 @@
 """empty message
 
 Revision ID: d87fc88225fd
-Revises: 
+Revises: 0c7e19a4d2b8
 Create Date: 2020-08-07 15:10:51.403769
 
 """
@@ -11,7 +11,7 @@ from sqlalchemy.dialects import postgresql
 
 # revision identifiers, used by Alembic.
 revision = 'd87fc88225fd'
-down_revision = None
+down_revision = '0c7e19a4d2b8'
 branch_labels = None
 depends_on = None
 
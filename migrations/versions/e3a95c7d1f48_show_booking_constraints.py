@@ -0,0 +1,45 @@
+"""show end times and double-booking constraints
+
+Revision ID: e3a95c7d1f48
+Revises: b6f2e8d4a913
+Create Date: 2026-10-18 14:37:21.094558
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a95c7d1f48'
+down_revision = 'b6f2e8d4a913'
+branch_labels = None
+depends_on = None
+
+
+# Show.start_time has no time zone, so the ranges are tsrange rather than
+# tstzrange. btree_gist lets the GiST index combine the integer equality on
+# venue_id / artist_id with the range overlap.
+#
+# Adding a constraint fails if existing shows already overlap; find them with
+#   SELECT a.id, b.id FROM "Show" a JOIN "Show" b ON a.venue_id = b.venue_id
+#     AND a.id < b.id AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time);
+# (and the same on artist_id) and resolve them first.
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute('''UPDATE "Show" SET end_time = start_time + interval '3 hours' ''')
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('Show_ends_after_start', 'Show', 'end_time > start_time')
+    for column in ('venue_id', 'artist_id'):
+        op.execute('''
+            ALTER TABLE "Show" ADD CONSTRAINT "Show_{name}_no_overlap"
+            EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)
+        '''.format(name=column[:-3], column=column))
+
+
+def downgrade():
+    op.drop_constraint('Show_artist_no_overlap', 'Show')
+    op.drop_constraint('Show_venue_no_overlap', 'Show')
+    op.drop_constraint('Show_ends_after_start', 'Show')
+    op.drop_column('Show', 'end_time')
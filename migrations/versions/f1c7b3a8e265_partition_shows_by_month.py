@@ -0,0 +1,129 @@
+"""partition Show by month of start_time
+
+Revision ID: f1c7b3a8e265
+Revises: e3a95c7d1f48
+Create Date: 2026-10-18 15:52:40.337019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7b3a8e265'
+down_revision = 'e3a95c7d1f48'
+branch_labels = None
+depends_on = None
+
+
+# Rebuilds "Show" as a table partitioned by RANGE (start_time), one partition
+# per month ("Show_2026_10") plus "Show_default" for anything outside them.
+# Range queries on start_time then only touch the months they cover.
+#
+# PostgreSQL requires the partition key in the primary key, so it becomes
+# (id, start_time); ids still come from the same sequence and stay unique.
+# Exclusion constraints cannot be declared on a partitioned table, so the
+# no-overlap constraints from e3a95c7d1f48 are created on every partition:
+# they hold within a month, and create_show_submission's conflict check
+# covers shows that cross a month boundary.
+#
+# "Show_ensure_partition"(date) creates the partition for a month if it is
+# missing; `flask create-show-partitions` calls it for the coming months and
+# should run (e.g. monthly from cron) before shows are booked that far ahead.
+
+ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION "Show_ensure_partition"(month date) RETURNS void AS $$
+DECLARE
+  first date := date_trunc('month', month)::date;
+  name text := 'Show_' || to_char(first, 'YYYY_MM');
+BEGIN
+  IF to_regclass(quote_ident(name)) IS NOT NULL THEN
+    RETURN;
+  END IF;
+  EXECUTE format('CREATE TABLE %I PARTITION OF "Show" FOR VALUES FROM (%L) TO (%L)',
+                 name, first, first + interval '1 month');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                 '(venue_id WITH =, tsrange(start_time, end_time) WITH &&)', name, name || '_venue_no_overlap');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                 '(artist_id WITH =, tsrange(start_time, end_time) WITH &&)', name, name || '_artist_no_overlap');
+END
+$$ LANGUAGE plpgsql;
+"""
+
+INDEXES = [
+    ('ix_Show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_Show_start_time_id', ['start_time', 'id']),
+]
+
+
+def upgrade():
+    for name, columns in INDEXES:
+        op.drop_index(name, table_name='Show')
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"')
+    op.execute('ALTER INDEX "Show_venue_no_overlap" RENAME TO "Show_unpartitioned_venue_no_overlap"')
+    op.execute('ALTER INDEX "Show_artist_no_overlap" RENAME TO "Show_unpartitioned_artist_no_overlap"')
+
+    op.execute('''
+        CREATE TABLE "Show" (LIKE "Show_unpartitioned" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)')
+    op.create_foreign_key('Show_venue_id_fkey', 'Show', 'Venue', ['venue_id'], ['id'])
+    op.create_foreign_key('Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'])
+
+    op.execute(ENSURE_PARTITION)
+    op.execute('''
+        DO $$
+        DECLARE
+          month date;
+        BEGIN
+          FOR month IN
+            SELECT generate_series(
+              date_trunc('month', least(coalesce(min(start_time), now()), now())),
+              date_trunc('month', greatest(coalesce(max(start_time), now()), now() + interval '12 months')),
+              interval '1 month')::date
+            FROM "Show_unpartitioned"
+          LOOP
+            PERFORM "Show_ensure_partition"(month);
+          END LOOP;
+        END
+        $$
+    ''')
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+    op.execute('''ALTER TABLE "Show_default" ADD CONSTRAINT "Show_default_venue_no_overlap"
+                  EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)''')
+    op.execute('''ALTER TABLE "Show_default" ADD CONSTRAINT "Show_default_artist_no_overlap"
+                  EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)''')
+
+    op.execute('INSERT INTO "Show" SELECT * FROM "Show_unpartitioned"')
+    # indexes on the parent are created on every partition, present and future
+    for name, columns in INDEXES:
+        op.create_index(name, 'Show', columns, unique=False)
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('DROP TABLE "Show_unpartitioned"')
+
+
+def downgrade():
+    for name, columns in INDEXES:
+        op.drop_index(name, table_name='Show')
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_partitioned"')
+    op.execute('ALTER TABLE "Show_partitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_partitioned_pkey"')
+
+    op.execute('CREATE TABLE "Show" (LIKE "Show_partitioned" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY (id)')
+    op.create_foreign_key('Show_venue_id_fkey', 'Show', 'Venue', ['venue_id'], ['id'])
+    op.create_foreign_key('Show_artist_id_fkey', 'Show', 'Artist', ['artist_id'], ['id'])
+    op.execute('INSERT INTO "Show" SELECT * FROM "Show_partitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('DROP TABLE "Show_partitioned" CASCADE')
+    op.execute('DROP FUNCTION "Show_ensure_partition"(date)')
+
+    for column in ('venue_id', 'artist_id'):
+        op.execute('''
+            ALTER TABLE "Show" ADD CONSTRAINT "Show_{name}_no_overlap"
+            EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)
+        '''.format(name=column[:-3], column=column))
+    for name, columns in INDEXES:
+        op.create_index(name, 'Show', columns, unique=False)
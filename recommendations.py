@@ -0,0 +1,155 @@
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+#----------------------------------------------------------------------------#
+# Recommendations.
+#
+# Offline, from the show history seen as a bipartite artist-venue graph:
+#
+#   similar_artists    artists that played the same venues (cosine over
+#                      their bookings), boosted by shared genres
+#   similar_venues     the same for venues
+#   venues_for_artist  venues that booked the artist's similar artists and
+#                      have not booked the artist yet
+#   artists_for_venue  artists that played the venue's similar venues and
+#                      have not played there yet
+#
+# Bookings are weighted by log(1 + number of shows). Candidates only come
+# from the show graph; genre overlap (cosine over genre sets) adds
+# genre_weight * overlap to their score but never adds candidates, which
+# would make every pair sharing a genre a candidate. Work is done chunk_size
+# subjects at a time so memory stays bounded.
+#
+# Needs NumPy and SciPy, which only the batch job imports.
+#----------------------------------------------------------------------------#
+
+KINDS = ('similar_artists', 'similar_venues', 'venues_for_artist', 'artists_for_venue')
+
+
+def normalize_rows(matrix):
+    # scale every row to unit length so dot products are cosine similarities
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def genre_matrix(genre_lists, genre_index):
+    rows, columns = [], []
+    for row, genres in enumerate(genre_lists):
+        for genre in set(genres or ()):
+            rows.append(row)
+            columns.append(genre_index[genre])
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                               shape=(len(genre_lists), len(genre_index)))
+    return normalize_rows(matrix)
+
+
+def genre_overlap(rows, columns, row_genres, column_genres):
+    # cosine between the genre sets of each (row, column) pair
+    if not len(rows):
+        return np.zeros(0)
+    return np.asarray(row_genres[rows].multiply(column_genres[columns]).sum(axis=1)).ravel()
+
+
+def ranked(scores, k, offset=0):
+    # (row + offset, columns, scores) of every row of a CSR matrix with
+    # its k best columns, best first
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        if start == end:
+            continue
+        columns, values = scores.indices[start:end], scores.data[start:end]
+        if len(values) > k:
+            keep = np.argpartition(-values, k)[:k]
+            columns, values = columns[keep], values[keep]
+        order = np.lexsort((columns, -values))
+        yield row + offset, columns[order], values[order]
+
+
+def similar(bookings, genres, k, genre_weight, chunk_size):
+    # bookings: subjects x counterparts, rows normalized
+    transposed = bookings.T.tocsr()
+    for start in range(0, bookings.shape[0], chunk_size):
+        stop = min(start + chunk_size, bookings.shape[0])
+        scores = bookings[start:stop].dot(transposed).tocoo()
+        keep = scores.col != scores.row + start
+        rows, columns, values = scores.row[keep], scores.col[keep], scores.data[keep]
+        values = values + genre_weight * genre_overlap(rows + start, columns, genres, genres)
+        matrix = sparse.csr_matrix((values, (rows, columns)), shape=(stop - start, bookings.shape[0]))
+        for result in ranked(matrix, k, start):
+            yield result
+
+
+def suggest(neighbours, booked, subject_genres, candidate_genres, k, genre_weight, chunk_size):
+    # neighbours: subjects x subjects similarity, booked: subjects x
+    # candidates 0/1. A candidate scores the summed similarity of the
+    # neighbours that booked it.
+    for start in range(0, neighbours.shape[0], chunk_size):
+        stop = min(start + chunk_size, neighbours.shape[0])
+        scores = neighbours[start:stop].dot(booked).tocsr()
+        scores = (scores - scores.multiply(booked[start:stop])).tocoo()
+        keep = scores.data > 0
+        rows, columns, values = scores.row[keep], scores.col[keep], scores.data[keep]
+        values = values + genre_weight * genre_overlap(rows + start, columns, subject_genres, candidate_genres)
+        matrix = sparse.csr_matrix((values, (rows, columns)), shape=(stop - start, booked.shape[1]))
+        for result in ranked(matrix, k, start):
+            yield result
+
+
+def recommend(artists, venues, shows, k=10, genre_weight=0.5, chunk_size=1024):
+    # artists and venues: (id, genres) pairs, shows: (artist_id, venue_id)
+    # pairs. Yields (kind, subject_id, position, candidate_id, score) rows,
+    # position counting from 0 for the best candidate.
+    if np is None:
+        raise RuntimeError('recommendations need numpy and scipy')
+    artists, venues = list(artists), list(venues)
+    artist_ids = np.array([id for id, genres in artists], dtype=np.int64)
+    venue_ids = np.array([id for id, genres in venues], dtype=np.int64)
+    artist_index = {id: row for row, (id, genres) in enumerate(artists)}
+    venue_index = {id: row for row, (id, genres) in enumerate(venues)}
+    genre_index = {}
+    for id, genres in artists + venues:
+        for genre in genres or ():
+            genre_index.setdefault(genre, len(genre_index))
+
+    rows, columns = [], []
+    for artist_id, venue_id in shows:
+        if artist_id in artist_index and venue_id in venue_index:
+            rows.append(artist_index[artist_id])
+            columns.append(venue_index[venue_id])
+    # duplicate (artist, venue) entries are summed into show counts
+    counts = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(artist_ids), len(venue_ids)))
+    counts.sum_duplicates()
+    booked = counts.copy()
+    booked.data[:] = 1
+    weighted = counts.copy()
+    weighted.data = np.log1p(weighted.data)
+
+    artist_genres = genre_matrix([genres for id, genres in artists], genre_index)
+    venue_genres = genre_matrix([genres for id, genres in venues], genre_index)
+
+    subjects = {
+        'artists': (artist_ids, normalize_rows(weighted), artist_genres, booked),
+        'venues': (venue_ids, normalize_rows(weighted.T.tocsr()), venue_genres, booked.T.tocsr()),
+    }
+    candidates = {'artists': (venue_ids, venue_genres), 'venues': (artist_ids, artist_genres)}
+    for side, similar_kind, suggest_kind in (('artists', 'similar_artists', 'venues_for_artist'),
+                                             ('venues', 'similar_venues', 'artists_for_venue')):
+        ids, bookings, genres, side_booked = subjects[side]
+        rows, columns, values = [], [], []
+        for row, neighbours, scores in similar(bookings, genres, k, genre_weight, chunk_size):
+            for position, (column, score) in enumerate(zip(neighbours, scores)):
+                yield similar_kind, int(ids[row]), position, int(ids[column]), float(score)
+            rows.extend([row] * len(neighbours))
+            columns.extend(neighbours)
+            values.extend(scores)
+        neighbour_matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(ids), len(ids)))
+
+        candidate_ids, candidate_genres = candidates[side]
+        for row, picks, scores in suggest(neighbour_matrix, side_booked, genres, candidate_genres,
+                                          k, genre_weight, chunk_size):
+            for position, (column, score) in enumerate(zip(picks, scores)):
+                yield suggest_kind, int(ids[row]), position, int(candidate_ids[column]), float(score)
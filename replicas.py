@@ -0,0 +1,65 @@
+import time
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# A round-robin set of replica engines. Each replica is health checked with a
+# `SELECT 1` at most every `health_interval` seconds; unhealthy replicas are
+# skipped until a later check succeeds, and when none is healthy choose()
+# returns None so the caller falls back to the primary. Only one thread checks
+# a replica at a time; the others go on with its last known state instead of
+# queueing behind a replica that may be timing out, and `connect_timeout`
+# (seconds, passed to libpq) bounds how long that one check can take.
+#----------------------------------------------------------------------------#
+
+class ReplicaSet(object):
+
+    def __init__(self, urls, health_interval=10, connect_timeout=None, **engine_options):
+        if connect_timeout is not None:
+            engine_options['connect_args'] = dict(engine_options.get('connect_args', {}),
+                                                  connect_timeout=connect_timeout)
+        self.engines = [create_engine(url, **engine_options) for url in urls]
+        self.health_interval = health_interval
+        self._health = [(True, 0.0)] * len(self.engines)
+        self._checking = [threading.Lock() for _ in self.engines]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _healthy(self, index):
+        healthy, checked = self._health[index]
+        if time.time() - checked < self.health_interval:
+            return healthy
+        if not self._checking[index].acquire(False):
+            return healthy
+        try:
+            # another thread may have finished a check since we looked
+            healthy, checked = self._health[index]
+            if time.time() - checked < self.health_interval:
+                return healthy
+            try:
+                with self.engines[index].connect() as conn:
+                    conn.execute(text('SELECT 1'))
+                healthy = True
+            except DBAPIError:
+                healthy = False
+            self._health[index] = (healthy, time.time())
+            return healthy
+        finally:
+            self._checking[index].release()
+
+    def choose(self):
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = self._next
+                self._next = (self._next + 1) % len(self.engines)
+            if self._healthy(index):
+                return self.engines[index]
+        return None
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose()
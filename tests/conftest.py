@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# app.py reads its configuration when imported: these tests need no database
+# server and write nothing inside the checkout
+os.environ.setdefault('FYYUR_ENV', 'testing')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('RESPONSE_CACHE', 'memory')
+os.environ.setdefault('TEMPLATE_CACHE_DIR', tempfile.mkdtemp(prefix='fyyur-templates-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# outside debug the app logs to error.log in the working directory
+os.chdir(tempfile.mkdtemp(prefix='fyyur-tests-'))
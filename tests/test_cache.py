@@ -0,0 +1,160 @@
+import os
+
+import pytest
+from jinja2 import Environment
+
+import cache
+from cache import MemoryCache, FileSystemCache, FragmentCacheExtension, create_cache
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'filesystem'])
+def backend(request, tmp_path, clock):
+    if request.param == 'memory':
+        return MemoryCache(ttl=60, max_entries=4)
+    return FileSystemCache(str(tmp_path / 'pages'), ttl=60, max_entries=4)
+
+
+def files(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, dirs, names in os.walk(directory) for name in names)
+
+
+def test_get_returns_what_was_set(backend):
+    assert backend.get('venue', '1') is None
+    backend.set('venue', '1', ('version', '<html>'))
+    assert backend.get('venue', '1') == ('version', '<html>')
+    assert backend.get('artist', '1') is None
+
+
+def test_entries_expire_after_ttl(backend, clock):
+    backend.set('venue', '1', 'page')
+    clock.now += 59
+    assert backend.get('venue', '1') == 'page'
+    clock.now += 2
+    assert backend.get('venue', '1') is None
+
+
+def test_delete_one_key_or_a_namespace(backend):
+    for key in ('1', '2'):
+        backend.set('venue', key, 'venue ' + key)
+    backend.set('shows', 'cursor=abc', 'shows')
+    backend.delete('venue', '1')
+    assert backend.get('venue', '1') is None
+    assert backend.get('venue', '2') == 'venue 2'
+    backend.delete('venue')
+    assert backend.get('venue', '2') is None
+    assert backend.get('shows', 'cursor=abc') == 'shows'
+
+
+def test_clear(backend):
+    backend.set('venue', '1', 'page')
+    backend.clear()
+    assert backend.get('venue', '1') is None
+
+
+def test_memory_cache_evicts_least_recently_used(clock):
+    memory = MemoryCache(ttl=60, max_entries=2)
+    memory.set('venue', '1', 'one')
+    memory.set('venue', '2', 'two')
+    memory.get('venue', '1')
+    memory.set('venue', '3', 'three')
+    assert memory.get('venue', '2') is None
+    assert memory.get('venue', '1') == 'one'
+    assert memory.get('venue', '3') == 'three'
+
+
+def test_filesystem_cache_hashes_keys_into_namespace_directories(tmp_path, clock):
+    directory = str(tmp_path / 'pages')
+    fs = FileSystemCache(directory)
+    fs.set('shows', '../../etc/passwd', 'page')
+    [path] = files(directory)
+    assert os.path.dirname(path) == 'shows'
+    assert len(os.path.basename(path)) == 40
+
+
+def test_filesystem_cache_stays_within_max_entries(tmp_path, clock):
+    directory = str(tmp_path / 'pages')
+    fs = FileSystemCache(directory, ttl=60, max_entries=20)
+    for number in range(100):
+        # entries are evicted oldest mtime first; give each write its own second
+        clock.now += 1
+        fs.set('shows', 'cursor={}'.format(number), 'page')
+        path = fs._path('shows', 'cursor={}'.format(number))
+        os.utime(path, (clock.now, clock.now))
+    assert len(files(directory)) <= 20
+    assert fs.get('shows', 'cursor=99') == 'page'
+    assert fs.get('shows', 'cursor=0') is None
+
+
+def test_filesystem_prune_removes_expired_entries(tmp_path, clock):
+    directory = str(tmp_path / 'pages')
+    fs = FileSystemCache(directory, ttl=60, max_entries=100)
+    fs.set('venue', '1', 'old')
+    os.utime(fs._path('venue', '1'), (clock.now - 120, clock.now - 120))
+    fs.set('venue', '2', 'new')
+    os.utime(fs._path('venue', '2'), (clock.now, clock.now))
+    fs.prune()
+    assert files(directory) == [os.path.relpath(fs._path('venue', '2'), directory)]
+
+
+def test_filesystem_cache_ignores_corrupt_entries(tmp_path, clock):
+    fs = FileSystemCache(str(tmp_path / 'pages'))
+    fs.set('venue', '1', 'page')
+    with open(fs._path('venue', '1'), 'wb') as f:
+        f.write(b'not a pickle')
+    assert fs.get('venue', '1') is None
+
+
+def test_create_cache(tmp_path):
+    config = {'RESPONSE_CACHE_TTL': 60, 'RESPONSE_CACHE_MAX_ENTRIES': 10, 'RESPONSE_CACHE_DIR': str(tmp_path)}
+    assert isinstance(create_cache(dict(config, RESPONSE_CACHE='memory')), MemoryCache)
+    assert isinstance(create_cache(dict(config, RESPONSE_CACHE='filesystem')), FileSystemCache)
+    assert create_cache(dict(config, RESPONSE_CACHE=None)) is None
+
+
+
+
+def fragment_environment(fragment_cache):
+    environment = Environment(extensions=[FragmentCacheExtension])
+    environment.fragment_cache = fragment_cache
+    return environment
+
+
+def test_fragment_is_rendered_once_per_key(clock):
+    calls = []
+    environment = fragment_environment(MemoryCache())
+    template = environment.from_string(
+        "{% cache 'tile', id, updated_at %}{{ render(id) }}{% endcache %}")
+    render = lambda id: calls.append(id) or 'tile {}'.format(id)
+    assert template.render(id=1, updated_at=1, render=render) == 'tile 1'
+    assert template.render(id=1, updated_at=1, render=render) == 'tile 1'
+    assert calls == [1]
+    # a new version of the entity is a new key
+    template.render(id=1, updated_at=2, render=render)
+    template.render(id=2, updated_at=1, render=render)
+    assert calls == [1, 1, 2]
+
+
+def test_fragment_cache_disabled_renders_every_time():
+    calls = []
+    environment = fragment_environment(None)
+    template = environment.from_string("{% cache 'tile', 1 %}{{ render() }}{% endcache %}")
+    render = lambda: calls.append(1) or 'tile'
+    assert template.render(render=render) + template.render(render=render) == 'tiletile'
+    assert len(calls) == 2
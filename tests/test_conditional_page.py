@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+from cache import MemoryCache
+
+UPDATED = datetime(2026, 10, 18, 20, 0, 30)
+
+
+class Page(object):
+    # a view decorated like the catalog pages, with a version it can change
+
+    def __init__(self, cached=False):
+        self.version = (3, UPDATED)
+        self.renders = 0
+        view = self.render
+        if cached:
+            view = fyyur.cached_page('test', lambda: 'page')(view)
+        self.view = fyyur.conditional_page(lambda now: self.version)(view)
+
+    def render(self):
+        self.renders += 1
+        return 'rendered {} for {}'.format(self.renders, self.version)
+
+    def get(self, path='/page', headers=None):
+        with fyyur.app.test_request_context(path, headers=headers or {}):
+            return self.view()
+
+
+@pytest.fixture
+def page_cache(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(fyyur, 'response_cache', cache)
+    return cache
+
+
+def test_fresh_request_renders_with_validators():
+    page = Page()
+    response = page.get()
+    assert response.status_code == 200
+    assert response.get_etag()[0]
+    assert response.last_modified is None
+    assert response.cache_control.no_cache
+    assert page.renders == 1
+
+
+def test_matching_etag_is_not_modified_without_rendering():
+    page = Page()
+    etag = page.get().get_etag()[0]
+    response = page.get(headers={'If-None-Match': '"{}"'.format(etag)})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert page.renders == 1
+
+
+def test_new_version_changes_the_etag():
+    page = Page()
+    etag = page.get().get_etag()[0]
+    page.version = (4, UPDATED)
+    response = page.get(headers={'If-None-Match': '"{}"'.format(etag)})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_etag_depends_on_the_query_string():
+    page = Page()
+    assert page.get('/page?genre=Jazz').get_etag()[0] != page.get('/page?genre=Folk').get_etag()[0]
+
+
+def test_new_count_with_the_same_timestamps_changes_the_etag():
+    # e.g. a venue other than the most recently updated one was deleted
+    page = Page()
+    page.version = (10, UPDATED)
+    etag = page.get().get_etag()[0]
+    page.version = (9, UPDATED)
+    response = page.get(headers={'If-None-Match': '"{}"'.format(etag)})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == 'rendered 2 for (9, {!r})'.format(UPDATED)
+
+
+def test_if_modified_since_alone_is_never_not_modified():
+    page = Page()
+    page.get()
+    page.version = (4, UPDATED)
+    response = page.get(headers={'If-Modified-Since': 'Mon, 01 Jan 2035 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert page.renders == 2
+
+
+def test_flashed_messages_bypass_validators():
+    page = Page()
+    with fyyur.app.test_request_context('/page'):
+        fyyur.flash('Venue was successfully listed!')
+        response = fyyur.make_response(page.view())
+    assert response.get_etag() == (None, None)
+    assert page.renders == 1
+
+
+def test_cached_body_is_served_for_its_version(page_cache):
+    page = Page(cached=True)
+    first = page.get().get_data(as_text=True)
+    assert page.get().get_data(as_text=True) == first
+    assert page.renders == 1
+
+
+def test_cached_body_is_not_served_for_a_newer_version(page_cache):
+    # e.g. a show started: nothing purged the cache but the version moved on
+    page = Page(cached=True)
+    page.get()
+    page.version = (4, UPDATED)
+    body = page.get().get_data(as_text=True)
+    assert page.renders == 2
+    assert body == 'rendered 2 for (4, {!r})'.format(UPDATED)
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('start_time', [
+    datetime(2026, 10, 18, 20, 0),
+    datetime(2026, 10, 18, 20, 0, 0, 123456),
+    datetime(1999, 12, 31, 23, 59, 59),
+])
+def test_round_trip(start_time):
+    cursor = fyyur.encode_cursor(start_time, 42)
+    assert fyyur.decode_cursor(cursor) == (start_time, 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = fyyur.encode_cursor(datetime(2026, 10, 18, 20, 0), 2 ** 40)
+    assert set(cursor) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=')
+
+
+def test_cursors_sort_like_their_rows():
+    # the cursor only carries the keyset; equal start times are told apart by id
+    first = fyyur.decode_cursor(fyyur.encode_cursor(datetime(2026, 1, 1, 20, 0), 7))
+    second = fyyur.decode_cursor(fyyur.encode_cursor(datetime(2026, 1, 1, 20, 0), 8))
+    assert first < second
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not base64!',
+    'YWJj',                                         # 'abc': no separator
+    'MjAyNi0xMC0xOFQyMDowMDowMHxvbmU=',             # '2026-10-18T20:00:00|one'
+    'bm90IGEgZGF0ZXw0Mg==',                         # 'not a date|42'
+    'MjAyNi0xMC0xOFQyMDowMDowMHw0Mnw0Mw==',         # three fields
+    '__8=',                                         # not UTF-8
+])
+def test_malformed_cursor_is_a_bad_request(cursor):
+    with pytest.raises(BadRequest):
+        fyyur.decode_cursor(cursor)
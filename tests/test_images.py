@@ -0,0 +1,100 @@
+import os
+import socket
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import images
+from images import HttpFetcher, ThumbnailCache, FetchError
+
+PUBLIC = '93.184.216.34'
+
+
+class Redirect(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(302)
+        self.send_header('Location', 'http://internal.example/latest/meta-data/')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    # {host: address}; records every lookup
+    answers, lookups = {}, []
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        lookups.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (answers[host], port))]
+
+    monkeypatch.setattr(images.socket, 'getaddrinfo', getaddrinfo)
+    return answers, lookups
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    # records every address connected to; PUBLIC is served by a local
+    # server that redirects to an internal host
+    server = HTTPServer(('127.0.0.1', 0), Redirect)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    connected = []
+
+    def connect(address, timeout, source_address=None):
+        connected.append(address)
+        if address[0] != PUBLIC:
+            raise OSError('unreachable')
+        sock = socket.socket()
+        sock.settimeout(timeout)
+        sock.connect(server.server_address)
+        return sock
+
+    monkeypatch.setattr(images.socket, 'create_connection', connect)
+    yield connected
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('url', ['file:///etc/passwd', 'ftp://example.com/a.jpg', 'http:///a.jpg'])
+def test_only_http_urls_are_fetched(url):
+    with pytest.raises(FetchError):
+        HttpFetcher().fetch(url)
+
+
+@pytest.mark.parametrize('address', ['127.0.0.1', '10.0.0.5', '169.254.169.254', '::ffff:192.168.0.1', '::1'])
+def test_non_public_addresses_are_refused_before_connecting(dns, connections, address):
+    answers, lookups = dns
+    answers['images.example'] = address
+    with pytest.raises(FetchError):
+        HttpFetcher().fetch('http://images.example/a.jpg')
+    assert connections == []
+
+
+def test_connects_to_the_address_it_checked(dns, connections):
+    answers, lookups = dns
+    answers['images.example'] = PUBLIC
+    answers['internal.example'] = '10.0.0.5'
+    with pytest.raises(FetchError) as e:
+        HttpFetcher().fetch('http://images.example/a.jpg')
+    # one lookup per host: the redirect's connection is checked the same way
+    assert lookups == ['images.example', 'internal.example']
+    assert connections == [(PUBLIC, 80)]
+    assert 'non-public address 10.0.0.5' in str(e.value)
+
+
+def test_cached_thumbnail_is_served_without_fetching(tmp_path):
+    class NoFetcher(object):
+        def fetch(self, url):
+            raise AssertionError('fetched ' + url)
+
+    thumbnails = ThumbnailCache(str(tmp_path), NoFetcher())
+    url = 'https://example.com/venue.jpg'
+    thumbnails._write(thumbnails._url_key(url), b'abc')
+    path = thumbnails._path('thumbs', 'abc-300.webp')
+    thumbnails._write(path, b'webp')
+    os.utime(path, (1000000, 1000000))
+    assert thumbnails.thumbnail(url, 300) == (path, 'image/webp')
+    assert os.path.getmtime(path) > 1000000
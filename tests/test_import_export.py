@@ -0,0 +1,186 @@
+import csv
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+import exporter
+from importer import import_rows, Checkpoint
+
+ARTIST_COLUMNS = ['id', 'name', 'genres', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+                  'website', 'seeking_venue', 'seeking_description']
+ARTISTS = [
+    (1, 'Guns N Petals', ['Rock n Roll'], 'San Francisco', 'CA', '326-123-5000',
+     'https://example.com/1.jpg', 'https://www.facebook.com/GunsNPetals', 'https://gunsnpetalsband.com',
+     True, 'Looking for shows to perform at in the San Francisco Bay Area!'),
+    (2, 'Matt Quevedo', ['Jazz', 'Classical'], 'New York', 'NY', '300-400-5000',
+     'https://example.com/2.jpg', 'https://www.facebook.com/mattquevedo923251523', 'https://mattquevedo.com',
+     False, ''),
+]
+VENUE_COLUMNS = ['id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+                 'website', 'seeking_talent', 'seeking_description']
+VENUES = [
+    (1, 'The Musical Hop', ['Jazz', 'Folk'], '1015 Folsom Street', 'San Francisco', 'CA', '123-123-1234',
+     'https://example.com/1.jpg', 'https://www.facebook.com/TheMusicalHop', 'https://www.themusicalhop.com',
+     True, 'We are on the lookout for a local artist to play every two weeks.'),
+    (2, 'The Dueling Pianos Bar', ['Classical', 'R&B'], '335 Delancey Street', 'New York', 'NY', '914-003-1132',
+     'https://example.com/2.jpg', 'https://www.facebook.com/theduelingpianos', 'https://www.theduelingpianos.com',
+     False, ''),
+]
+SHOW_COLUMNS = ['id', 'venue_id', 'artist_id', 'start_time', 'end_time']
+SHOWS = [
+    (1, 1, 1, datetime(2019, 5, 21, 21, 30), datetime(2019, 5, 22, 0, 30)),
+    (2, 3, 2, datetime(2035, 4, 1, 20, 0, 0, 250000), datetime(2035, 4, 1, 23, 0)),
+]
+
+
+class RowError(Exception):
+    # stands in for IntegrityError: the database refused these rows
+    pass
+
+
+def write_csv(path, rows, columns):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def export_to(path, rows, columns, format):
+    with open(path, 'wb') as f:
+        for chunk in exporter.export_chunks(rows, columns, format, chunk_rows=1):
+            f.write(chunk)
+
+
+def import_from(path, kind, insert_batch=None, batch_size=5000):
+    records = []
+    with fyyur.app.test_request_context():
+        counts = import_rows(path, fyyur.import_validator(kind), insert_batch or records.extend, batch_size,
+                             row_errors=(RowError,))
+    return counts, records
+
+
+def show_records(rows):
+    return [dict(zip(SHOW_COLUMNS[1:], row[1:])) for row in rows]
+
+
+@pytest.mark.parametrize('format', exporter.FORMATS)
+def test_artists_round_trip(tmp_path, format):
+    path = str(tmp_path / ('artists.' + format))
+    export_to(path, ARTISTS, ARTIST_COLUMNS, format)
+    counts, records = import_from(path, 'artists')
+    assert counts == (2, 0, 0)
+    assert records == [dict(zip(ARTIST_COLUMNS[1:], row[1:])) for row in ARTISTS]
+
+
+@pytest.mark.parametrize('format', exporter.FORMATS)
+def test_venues_round_trip(tmp_path, format):
+    path = str(tmp_path / ('venues.' + format))
+    export_to(path, VENUES, VENUE_COLUMNS, format)
+    counts, records = import_from(path, 'venues')
+    assert counts == (2, 0, 0)
+    assert records == [dict(zip(VENUE_COLUMNS[1:], row[1:])) for row in VENUES]
+
+
+@pytest.mark.parametrize('format', exporter.FORMATS)
+def test_shows_round_trip(tmp_path, format):
+    path = str(tmp_path / ('shows.' + format))
+    export_to(path, SHOWS, SHOW_COLUMNS, format)
+    counts, records = import_from(path, 'shows')
+    assert counts == (2, 0, 0)
+    assert records == show_records(SHOWS)
+
+
+def test_gzip_chunks_decompress_to_the_plain_export():
+    plain = b''.join(exporter.export_chunks(SHOWS, SHOW_COLUMNS, 'jsonl', chunk_rows=1))
+    compressed = b''.join(exporter.gzip_chunks(exporter.export_chunks(SHOWS, SHOW_COLUMNS, 'jsonl', chunk_rows=1)))
+    assert gzip.decompress(compressed) == plain
+
+
+@pytest.mark.parametrize('query, compressed', [('', False), ('?gzip=0', False), ('?gzip=1', True)])
+def test_export_route_gzips_only_when_asked(monkeypatch, query, compressed):
+    monkeypatch.setattr(fyyur, 'export_rows', lambda kind: (SHOW_COLUMNS, SHOWS))
+    response = fyyur.app.test_client().get('/export/shows.jsonl' + query)
+    plain = b''.join(exporter.export_chunks(SHOWS, SHOW_COLUMNS, 'jsonl'))
+    if compressed:
+        assert response.mimetype == 'application/gzip'
+        assert response.headers['Content-Disposition'].endswith('shows.jsonl.gz')
+        assert gzip.decompress(response.get_data()) == plain
+    else:
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.get_data() == plain
+
+
+def test_invalid_rows_are_reported_and_skipped(tmp_path):
+    path = str(tmp_path / 'artists.jsonl')
+    rows = [{'name': 'Guns N Petals', 'genres': ['Rock n Roll'], 'city': 'San Francisco', 'state': 'CA',
+             'phone': '326-123-5000', 'facebook_link': 'https://www.facebook.com/GunsNPetals',
+             'website': 'https://gunsnpetalsband.com', 'image_link': 'https://example.com/1.jpg'}]
+    rows.append(dict(rows[0], name=''))
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+    counts, records = import_from(path, 'artists')
+    assert counts == (1, 1, 0)
+    with open(path + '.errors.jsonl') as f:
+        [error] = [json.loads(line) for line in f]
+    assert error['row'] == 2 and 'name' in error['errors']
+
+
+def test_interrupted_import_resumes_after_the_checkpoint(tmp_path):
+    path = str(tmp_path / 'shows.csv')
+    write_csv(path, SHOWS, SHOW_COLUMNS)
+    imported = []
+
+    def insert_once(records):
+        if imported:
+            raise KeyboardInterrupt
+        imported.extend(records)
+
+    with pytest.raises(KeyboardInterrupt):
+        import_from(path, 'shows', insert_once, batch_size=1)
+    assert Checkpoint(path + '.checkpoint').load() == 1
+    counts, records = import_from(path, 'shows')
+    assert counts == (1, 0, 1)
+    assert imported + records == show_records(SHOWS)
+
+
+def test_failed_batch_is_retried_row_by_row_with_a_checkpoint_per_row(tmp_path):
+    path = str(tmp_path / 'shows.csv')
+    write_csv(path, SHOWS, SHOW_COLUMNS)
+    checkpoint = Checkpoint(path + '.checkpoint')
+    inserted, saved = [], []
+
+    def insert_batch(records):
+        # the database refuses the second show (say its venue is missing)
+        saved.append(checkpoint.load())
+        if any(record['venue_id'] == 3 for record in records):
+            raise RowError('venue 3 does not exist')
+        inserted.extend(records)
+
+    counts, records = import_from(path, 'shows', insert_batch)
+    assert counts == (1, 1, 0)
+    assert [record['venue_id'] for record in inserted] == [1]
+    # batch, then row 1, then row 2 after row 1's checkpoint
+    assert saved == [0, 0, 1]
+    assert checkpoint.load() == 2
+
+
+def test_other_failures_stop_the_import_without_moving_the_checkpoint(tmp_path):
+    # a lost connection must not turn every remaining row into a rejection
+    path = str(tmp_path / 'shows.csv')
+    write_csv(path, SHOWS, SHOW_COLUMNS)
+
+    def insert_batch(records):
+        raise OSError('server closed the connection unexpectedly')
+
+    with pytest.raises(OSError):
+        import_from(path, 'shows', insert_batch)
+    assert Checkpoint(path + '.checkpoint').load() == 0
+    with open(path + '.errors.jsonl') as f:
+        assert f.read() == ''
+    counts, records = import_from(path, 'shows')
+    assert counts == (2, 0, 0)
+    assert records == show_records(SHOWS)
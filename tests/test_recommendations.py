@@ -0,0 +1,92 @@
+import math
+from collections import defaultdict
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+from recommendations import recommend, KINDS
+
+ARTISTS = [(1, ['Jazz']), (2, ['Jazz']), (3, ['Rock']), (4, ['Jazz'])]
+VENUES = [(10, ['Jazz']), (20, ['Jazz']), (30, ['Rock'])]
+# artist 2 played venue 30 twice; artist 4 never played anywhere
+SHOWS = [(1, 10), (2, 10), (1, 20), (2, 20), (2, 30), (2, 30), (3, 30)]
+
+
+def grouped(rows):
+    # {kind: {subject: [(candidate, score), ...] best first}}
+    result = defaultdict(lambda: defaultdict(list))
+    for kind, subject, position, candidate, score in rows:
+        assert position == len(result[kind][subject])
+        result[kind][subject].append((candidate, score))
+    return result
+
+
+def run(**kwargs):
+    return grouped(recommend(ARTISTS, VENUES, SHOWS, **kwargs))
+
+
+def test_kinds():
+    assert set(run()) == set(KINDS)
+
+
+def test_similarity_is_cosine_over_log_weighted_bookings():
+    similar = run(genre_weight=0)['similar_artists']
+    one = np.array([math.log(2), math.log(2), 0])
+    two = np.array([math.log(2), math.log(2), math.log(3)])
+    expected = one.dot(two) / np.linalg.norm(one) / np.linalg.norm(two)
+    assert similar[1] == [(2, pytest.approx(expected))]
+
+
+def test_genre_overlap_boosts_existing_candidates_only():
+    plain = run(genre_weight=0)['similar_artists']
+    boosted = run(genre_weight=0.5)['similar_artists']
+    # artists 1 and 2 are both Jazz only: cosine of their genre sets is 1
+    assert dict(boosted[1])[2] == pytest.approx(dict(plain[1])[2] + 0.5)
+    # artist 2 and 3 share a venue but no genre
+    assert dict(boosted[2])[3] == pytest.approx(dict(plain[2])[3])
+    # artist 4 shares Jazz with 1 and 2 but has no shows, so no candidates
+    assert 4 not in boosted
+    assert all(candidate != 4 for candidates in boosted.values() for candidate, score in candidates)
+
+
+def test_subjects_are_not_similar_to_themselves():
+    result = run()
+    for kind in ('similar_artists', 'similar_venues'):
+        for subject, candidates in result[kind].items():
+            assert subject not in [candidate for candidate, score in candidates]
+
+
+def test_suggestions_leave_out_what_was_already_booked():
+    result = run()
+    assert result['venues_for_artist'][1] == [(30, pytest.approx(dict(result['similar_artists'][1])[2]))]
+    # artist 2 has played every venue
+    assert 2 not in result['venues_for_artist']
+    assert [candidate for candidate, score in result['artists_for_venue'][30]] == [1]
+
+
+def test_candidates_are_best_first_and_cut_at_k():
+    result = run(k=1)
+    for kind in KINDS:
+        for candidates in result[kind].values():
+            assert len(candidates) == 1
+    for kind in KINDS:
+        for candidates in run(k=10)[kind].values():
+            scores = [score for candidate, score in candidates]
+            assert scores == sorted(scores, reverse=True)
+
+
+def test_chunking_does_not_change_the_result():
+    assert sorted(recommend(ARTISTS, VENUES, SHOWS, chunk_size=1)) == \
+        sorted(recommend(ARTISTS, VENUES, SHOWS, chunk_size=1024))
+
+
+def test_shows_of_unknown_artists_or_venues_are_ignored():
+    rows = recommend(ARTISTS, VENUES, SHOWS + [(99, 10), (1, 99)])
+    assert sorted(rows) == sorted(recommend(ARTISTS, VENUES, SHOWS))
+
+
+def test_empty_history():
+    assert list(recommend(ARTISTS, VENUES, [])) == []
+    assert list(recommend([], [], [])) == []
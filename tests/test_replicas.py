@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from replicas import ReplicaSet
+
+
+class Replica(object):
+    # stands in for engine.connect(); blocks while `hang` is clear
+
+    def __init__(self, up=True):
+        self.up = up
+        self.checks = 0
+        self.hang = threading.Event()
+        self.hang.set()
+        self.entered = threading.Event()
+
+    def connect(self):
+        self.checks += 1
+        self.entered.set()
+        self.hang.wait()
+        if not self.up:
+            raise OperationalError('SELECT 1', {}, Exception('connection timed out'))
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement):
+        pass
+
+
+@pytest.fixture
+def replica_set():
+    replica_set = ReplicaSet(['sqlite://', 'sqlite://'], health_interval=60)
+    replica_set.engines = [Replica(), Replica()]
+    return replica_set
+
+
+def test_round_robin_over_healthy_replicas(replica_set):
+    first, second = replica_set.engines
+    assert [replica_set.choose() for _ in range(3)] == [first, second, first]
+    # checked once each, then the result is reused for health_interval
+    assert (first.checks, second.checks) == (1, 1)
+
+
+def test_unhealthy_replicas_are_skipped_until_none_is_left(replica_set):
+    first, second = replica_set.engines
+    first.up = False
+    assert [replica_set.choose() for _ in range(2)] == [second, second]
+    second.up = False
+    replica_set._health[1] = (True, 0.0)
+    assert replica_set.choose() is None
+
+
+def test_only_one_thread_waits_on_a_slow_check(replica_set):
+    first, second = replica_set.engines
+    first.hang.clear()
+    checker = threading.Thread(target=replica_set._healthy, args=(0,))
+    checker.start()
+    assert first.entered.wait(5)
+    # the check is still running: use the last known state without waiting
+    assert replica_set._healthy(0) is True
+    assert first.checks == 1
+    first.up = False
+    first.hang.set()
+    checker.join(5)
+    assert replica_set._healthy(0) is False
+    assert first.checks == 1
+
+
+def test_connect_timeout_is_passed_to_the_driver(monkeypatch):
+    engines = []
+    monkeypatch.setattr('replicas.create_engine', lambda url, **options: engines.append(options))
+    ReplicaSet(['postgresql://replica/fyyur'], connect_timeout=2, connect_args={'sslmode': 'require'})
+    assert engines == [{'connect_args': {'sslmode': 'require', 'connect_timeout': 2}}]
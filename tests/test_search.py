@@ -0,0 +1,19 @@
+import re
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_facet_and_pager_forms_keep_the_city_and_state(monkeypatch, kind):
+    results = {'data': [], 'count': 45, 'facets': [('Jazz', 30), ('Folk', 15)], 'page': 2, 'per_page': 20}
+    monkeypatch.setattr(fyyur, 'search_catalog', lambda model, term, page, **filters: results)
+    response = fyyur.app.test_client().post('/{}/search'.format(kind), data={
+        'search_term': 'hop', 'genre': 'Jazz', 'city': 'San Francisco', 'state': 'CA', 'page': '2'})
+    forms = re.findall(r'<form class="(genre-facets|search-pager)"(.*?)</form>', response.get_data(as_text=True), re.S)
+    assert [name for name, form in forms] == ['genre-facets', 'search-pager']
+    for name, form in forms:
+        assert '<input type="hidden" name="city" value="San Francisco">' in form
+        assert '<input type="hidden" name="state" value="CA">' in form
+        assert '<input type="hidden" name="genre" value="Jazz">' in form
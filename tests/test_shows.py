@@ -0,0 +1,18 @@
+import pytest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('end_time', ['2035-04-01 20:00:00', '2035-04-01 19:00:00'])
+def test_show_must_end_after_it_starts(monkeypatch, end_time):
+    monkeypatch.setattr(fyyur, 'lock_bookings', lambda *args: pytest.fail('booked'))
+    response = fyyur.app.test_client().post('/shows/create', data={'venue_id': '1', 'artist_id': '1',
+                                                              'start_time': '2035-04-01 20:00:00', 'end_time': end_time})
+    assert response.status_code == 200
+    assert 'The show could not be listed: it must end after it starts.' in response.get_data(as_text=True)
+
+
+def test_model_declares_the_end_after_start_constraint():
+    constraints = {constraint.name: str(constraint.sqltext) for constraint in fyyur.Show.__table__.constraints
+                   if constraint.name == 'Show_ends_after_start'}
+    assert constraints == {'Show_ends_after_start': 'end_time > start_time'}
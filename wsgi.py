@@ -0,0 +1,7 @@
+# WSGI entry point for production servers, e.g.
+#   FYYUR_ENV=production SECRET_KEY=... DATABASE_URL=... gunicorn wsgi:app
+# gunicorn picks up its settings from gunicorn.conf.py in this directory.
+from app import app
+
+if __name__ == '__main__':
+    app.run()